@@ -0,0 +1,686 @@
+"""
+Local stand-in for the parts of the SharePoint REST API used by the plugin, for benchmarking.
+
+Emulates contextinfo, $batch, folders and files (listings, properties, /$value, Files/add,
+upload sessions, moves and deletions), the recursive GetItems query and lists (fields, items
+with $select / $filter / $top / $orderby and next page links, ItemCount, ETags, GetChanges).
+Every response can be delayed and a share of them throttled with 429 responses.
+"""
+import re
+import sys
+import json
+import time
+import random
+import operator
+import threading
+import urllib.parse
+
+from collections import OrderedDict
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+VERBOSE_JSON = "application/json;odata=verbose"
+NOMETADATA_JSON = "application/json;odata=nometadata"
+LAST_MODIFIED = "2023-05-02T10:00:00Z"
+LIST_ID = "0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0"
+# Like on a real list, computed and hidden fields share the title of the columns they derive from
+DEFAULT_FIELDS = [
+    ("Title", "Title", "Text", False, False, None),
+    ("ID", "ID", "Counter", False, True, None),
+    ("Modified", "Modified", "DateTime", False, True, None),
+    ("Created", "Created", "DateTime", False, True, None),
+    ("ContentType", "ContentType", "Computed", True, False, None),
+    ("Attachments", "Attachments", "Attachments", False, False, None),
+    ("Title", "LinkTitleNoMenu", "Computed", False, True, None),
+    ("Title", "LinkTitle", "Computed", False, True, None),
+    ("Title", "LinkTitle2", "Computed", True, True, None),
+    ("Modified", "Last_x0020_Modified", "Lookup", True, True, "TimeLastModified"),
+    ("Created", "Created_x0020_Date", "Lookup", True, True, "TimeCreated")
+]
+
+
+class MockSharePointState(object):
+    # In memory document library and lists, with the counters reported by the benchmarks
+
+    def __init__(self, site="bench", root="Shared Documents", page_size=100, latency=0.0, throttling_rate=0.0, retry_after=0):
+        self.site = site
+        self.root = root
+        self.page_size = page_size
+        self.latency = latency
+        self.throttling_rate = throttling_rate
+        self.retry_after = retry_after
+        self.lock = threading.RLock()
+        self.folders = {}
+        self.files = {}
+        self.uploads = {}
+        self.lists = {}
+        self.change_counter = 0
+        self.add_folder(self.get_root_path())
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = {}
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.throttled_requests = 0
+
+    def count_request(self, route, bytes_received):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_received += bytes_received
+
+    def count_response(self, bytes_sent):
+        with self.lock:
+            self.bytes_sent += bytes_sent
+
+    def get_counters(self):
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "requests_by_route": dict(self.requests),
+                "throttled_requests": self.throttled_requests,
+                "bytes_received": self.bytes_received,
+                "bytes_sent": self.bytes_sent
+            }
+
+    def normalize_path(self, path):
+        return re.sub(r"/+", "/", path).rstrip("/")
+
+    def get_root_path(self):
+        return "/{}/{}".format(self.site, self.root)
+
+    def add_folder(self, path):
+        with self.lock:
+            path = self.normalize_path(path)
+            parent_path = path.rsplit("/", 1)[0]
+            if parent_path and parent_path != path and parent_path not in self.folders and parent_path.startswith(self.get_root_path()):
+                self.add_folder(parent_path)
+            self.folders.setdefault(path, LAST_MODIFIED)
+
+    def add_file(self, path, content):
+        with self.lock:
+            path = self.normalize_path(path)
+            self.add_folder(path.rsplit("/", 1)[0])
+            self.files[path] = content
+
+    def add_tree(self, path, depth, breadth, files_per_folder, file_size):
+        # Folder tree of breadth sub folders per level, each folder holding files_per_folder files
+        content = b"x" * file_size
+        folders = [self.get_root_path() + path.rstrip("/")]
+        for level in range(depth + 1):
+            sub_folders = []
+            for folder in folders:
+                self.add_folder(folder)
+                for file_index in range(files_per_folder):
+                    self.add_file("{}/file_{}.csv".format(folder, file_index), content)
+                if level < depth:
+                    sub_folders.extend("{}/folder_{}".format(folder, folder_index) for folder_index in range(breadth))
+            folders = sub_folders
+
+    def add_list(self, title, item_count=0, columns=None):
+        columns = ["Title"] if columns is None else columns
+        with self.lock:
+            fields = [{
+                "Title": field_title,
+                "EntityPropertyName": internal_name,
+                "StaticName": internal_name,
+                "TypeAsString": field_type,
+                "Hidden": hidden,
+                "ReadOnlyField": read_only,
+                "LookupField": lookup_field
+            } for field_title, internal_name, field_type, hidden, read_only, lookup_field in DEFAULT_FIELDS]
+            sharepoint_list = {
+                "title": title,
+                # SharePoint names the item type after the list URL at creation, it does not follow renames
+                "entity_type": "SP.Data.{}{}ListItem".format(title[:1].upper(), title[1:].replace(" ", "_x0020_")),
+                "fields": fields,
+                "items": OrderedDict(),
+                "next_id": 1,
+                "version": 1,
+                "changes": [],
+                "filtered_items": {}
+            }
+            self.lists[title.lower()] = sharepoint_list
+            for column in columns:
+                if column != "Title":
+                    self.add_field(sharepoint_list, column, "Text")
+            for item_index in range(item_count):
+                self.add_item(sharepoint_list, dict((column, "{}_{}".format(column, item_index)) for column in columns))
+            return sharepoint_list
+
+    def add_field(self, sharepoint_list, field_title, field_type):
+        # Internal names are unique, a second "Title" field is named Title0
+        internal_name = field_title.replace(" ", "_x0020_")
+        internal_names = set(field["EntityPropertyName"] for field in sharepoint_list["fields"])
+        suffix = 0
+        while internal_name in internal_names:
+            internal_name = "{}{}".format(field_title.replace(" ", "_x0020_"), suffix)
+            suffix += 1
+        field = {
+            "Title": field_title,
+            "EntityPropertyName": internal_name,
+            "StaticName": internal_name,
+            "TypeAsString": field_type,
+            "Hidden": False,
+            "ReadOnlyField": False,
+            "LookupField": None
+        }
+        sharepoint_list["fields"].append(field)
+        sharepoint_list["version"] += 1
+        return field
+
+    def get_stored_values(self, sharepoint_list, values):
+        # Values as SharePoint returns them once written: dates without milliseconds, booleans and numbers typed
+        field_types = dict((field["EntityPropertyName"], field["TypeAsString"]) for field in sharepoint_list["fields"])
+        stored_values = {}
+        for key, value in values.items():
+            field_type = field_types.get(key)
+            if key == "__metadata":
+                continue
+            if value in [None, ""]:
+                value = None
+            elif field_type == "DateTime":
+                value = re.sub(r"\.\d+Z$", "Z", "{}".format(value))
+            elif field_type == "Boolean":
+                value = "{}".format(value).lower() in ["true", "1", "yes"]
+            elif field_type in ["Number", "Integer", "Currency"]:
+                value = float(value)
+            stored_values[key] = value
+        return stored_values
+
+    def add_item(self, sharepoint_list, values):
+        item_id = sharepoint_list["next_id"]
+        sharepoint_list["next_id"] += 1
+        item = dict(values, ID=item_id, Modified=LAST_MODIFIED, Created=LAST_MODIFIED)
+        sharepoint_list["items"][item_id] = item
+        self.record_change(sharepoint_list, item_id, 1)
+        return item
+
+    def record_change(self, sharepoint_list, item_id, change_type):
+        self.change_counter += 1
+        sharepoint_list["changes"].append((self.change_counter, item_id, change_type))
+
+    def get_list(self, title):
+        return self.lists.get(urllib.parse.unquote(title).lower())
+
+
+class MockSharePointServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state, port=0):
+        HTTPServer.__init__(self, ("127.0.0.1", port), MockSharePointHandler)
+        self.state = state
+        self.thread = None
+
+    def get_origin(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients drop their kept-alive connections when they exit
+        if not isinstance(sys.exc_info()[1], ConnectionResetError):
+            HTTPServer.handle_error(self, request, client_address)
+
+
+class MockSharePointHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which Nagle's algorithm would delay on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        url = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(url.path)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        method = self.headers.get("X-HTTP-Method", method).upper()
+        if state.latency > 0:
+            time.sleep(state.latency)
+        if state.throttling_rate > 0 and random.random() < state.throttling_rate:
+            with state.lock:
+                state.throttled_requests += 1
+            state.count_request("throttled", len(body))
+            return self.send_json(429, {"error": {"message": {"value": "Throttled"}}}, {"Retry-After": "{}".format(state.retry_after)})
+        try:
+            route, status_code, payload, headers = self.route(method, path, query, body)
+        except KeyError as error:
+            route, status_code, payload, headers = "not_found", 404, {"error": {"message": {"value": "Not found: {}".format(error)}}}, None
+        except Exception as error:
+            route, status_code, payload, headers = "error", 500, {"error": {"message": {"value": "{}".format(error)}}}, None
+        state.count_request(route, len(body))
+        if isinstance(payload, bytes):
+            headers = dict(headers or {})
+            content_type = headers.pop("Content-Type", "application/octet-stream")
+            return self.send_bytes(status_code, payload, content_type, headers)
+        return self.send_json(status_code, payload, headers)
+
+    def send_json(self, status_code, payload, headers=None):
+        if payload is None:
+            return self.send_bytes(status_code, b"", None, headers)
+        content_type = NOMETADATA_JSON if self.is_nometadata() else VERBOSE_JSON
+        return self.send_bytes(status_code, json.dumps(payload).encode("utf-8"), content_type, headers)
+
+    def send_bytes(self, status_code, content, content_type, headers=None):
+        self.send_response(status_code)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        for header in (headers or {}):
+            self.send_header(header, headers[header])
+        self.send_header("Content-Length", "{}".format(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        self.server.state.count_response(len(content))
+
+    def is_nometadata(self):
+        return "nometadata" in self.headers.get("Accept", "")
+
+    def route(self, method, path, query, body):
+        state = self.server.state
+        api_prefix = "/{}/_api/".format(state.site)
+        if not path.startswith(api_prefix):
+            raise KeyError(path)
+        api_path = path[len(api_prefix):]
+        if api_path == "contextinfo":
+            return "contextinfo", 200, {"d": {"GetContextWebInformation": {"FormDigestValue": "mock-digest", "FormDigestTimeoutSeconds": 1800}}}, None
+        if api_path == "$batch":
+            return self.route_batch(body)
+        match = re.match(r"^Web/GetFolderByServerRelativeUrl\('(.*?)'\)(/.*)?$", api_path)
+        if match:
+            return self.route_folder(method, match.group(1), match.group(2) or "", query, body)
+        match = re.match(r"^Web/GetFileByServerRelativeUrl\('(.*?)'\)(/.*)?$", api_path)
+        if match:
+            return self.route_file(method, match.group(1), match.group(2) or "", body)
+        match = re.match(r"^Web/Folders/add\('(.*)'\)$", api_path)
+        if match:
+            state.add_folder("/{}/{}".format(state.site, match.group(1)))
+            return "add_folder", 200, {"d": {"Exists": True}}, None
+        match = re.match(r"^Web/lists\(guid'.*'\)/GetItems$", api_path)
+        if match:
+            return self.route_recursive_query(json.loads(body.decode("utf-8")))
+        if api_path == "Web/lists" and method == "POST":
+            title = json.loads(body.decode("utf-8"))["Title"]
+            with state.lock:
+                state.add_list(title)
+            return "create_list", 201, {"d": {"Title": title}}, None
+        match = re.match(r"^Web/lists/GetByTitle\('(.*?)'\)(/.*)?$", api_path)
+        if match:
+            return self.route_list(method, match.group(1), match.group(2) or "", query, body)
+        raise KeyError(api_path)
+
+    def route_batch(self, body):
+        # Runs the operations of a $batch request one after the other, and answers them in a single changeset
+        operations = []
+        operation = None
+        for line in body.decode("utf-8").split("\r\n"):
+            request_line = re.match(r"^(GET|POST|PUT|PATCH|MERGE|DELETE) (\S+) HTTP/1\.1$", line)
+            if line.startswith("--"):
+                operation = None
+            elif request_line:
+                operation = {"method": request_line.group(1), "url": request_line.group(2), "headers": {}, "body": None}
+                operations.append(operation)
+            elif operation is not None and operation["body"] is None:
+                if line == "":
+                    operation["body"] = []
+                elif ":" in line:
+                    header, value = line.split(":", 1)
+                    operation["headers"][header.strip().lower()] = value.strip()
+            elif operation is not None:
+                operation["body"].append(line)
+        lines = ["--batchresponse_mock", "Content-Type: multipart/mixed; boundary=changesetresponse_mock", ""]
+        for operation in operations:
+            url = urllib.parse.urlsplit(operation["url"])
+            method = operation["headers"].get("x-http-method", operation["method"]).upper()
+            body = "\n".join(operation["body"] or []).encode("utf-8")
+            try:
+                route, status_code, payload, headers = self.route(
+                    method,
+                    urllib.parse.unquote(url.path),
+                    dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True)),
+                    body
+                )
+            except KeyError as error:
+                status_code, payload = 404, {"error": {"message": {"value": "Not found: {}".format(error)}}}
+            except Exception as error:
+                status_code, payload = 500, {"error": {"message": {"value": "{}".format(error)}}}
+            lines.extend([
+                "--changesetresponse_mock",
+                "Content-Type: application/http",
+                "Content-Transfer-Encoding: binary",
+                "",
+                "HTTP/1.1 {} {}".format(status_code, self.responses.get(status_code, ("",))[0]),
+                "CONTENT-TYPE: {}".format(VERBOSE_JSON),
+                "",
+                json.dumps(payload) if payload is not None else ""
+            ])
+        lines.extend(["--changesetresponse_mock--", "--batchresponse_mock--", ""])
+        content = "\r\n".join(lines).encode("utf-8")
+        return "batch", 200, content, {"Content-Type": "multipart/mixed; boundary=batchresponse_mock"}
+
+    def route_folder(self, method, folder_path, sub_path, query, body):
+        state = self.server.state
+        folder_path = state.normalize_path(folder_path)
+        with state.lock:
+            if sub_path in ["/Folders", "/Files"]:
+                if folder_path not in state.folders:
+                    raise KeyError(folder_path)
+                return "list_" + sub_path[1:].lower(), 200, self.get_collection(self.get_children(folder_path, sub_path == "/Files"), query), None
+            if sub_path == "/Properties":
+                return "folder_properties", 200, {"d": {"vti_x005f_listname": "{" + LIST_ID + "}"}}, None
+            match = re.match(r"^/Files/add\(url='(.*)',overwrite=true\)$", sub_path)
+            if match:
+                file_path = "{}/{}".format(folder_path, match.group(1))
+                state.add_file(file_path, body)
+                return "add_file", 200, {"d": self.get_file_entity(file_path)}, None
+            if method == "DELETE":
+                for path in [path for path in state.files if path.startswith(folder_path + "/")]:
+                    del state.files[path]
+                for path in [path for path in state.folders if path == folder_path or path.startswith(folder_path + "/")]:
+                    del state.folders[path]
+                return "delete_folder", 200, None, None
+            if folder_path not in state.folders:
+                return "folder_properties", 200, {"d": {"Exists": False}}, None
+            return "folder_properties", 200, {"d": self.select(self.get_folder_entity(folder_path), query)}, None
+
+    def route_file(self, method, file_path, sub_path, body):
+        state = self.server.state
+        file_path = state.normalize_path(file_path)
+        with state.lock:
+            if sub_path == "/$value":
+                return "read_file", 200, state.files[file_path], None
+            match = re.match(r"^/(StartUpload|ContinueUpload|FinishUpload|CancelUpload)\(uploadId=guid'(.*?)'(?:,fileOffset=(\d+))?\)$", sub_path)
+            if match:
+                operation, upload_id, file_offset = match.groups()
+                if operation == "CancelUpload":
+                    state.uploads.pop(upload_id, None)
+                    return "upload_chunk", 200, None, None
+                if operation == "StartUpload":
+                    if upload_id in state.uploads:
+                        return "upload_chunk", 400, {"error": {"message": {"value": "Upload already started"}}}, None
+                    state.uploads[upload_id] = []
+                elif upload_id not in state.uploads or int(file_offset) != sum(len(chunk) for chunk in state.uploads[upload_id]):
+                    # Like SharePoint, chunks are only accepted at the offset the upload is at
+                    return "upload_chunk", 400, {"error": {"message": {"value": "Invalid upload offset"}}}, None
+                state.uploads[upload_id].append(body)
+                if operation == "FinishUpload":
+                    state.files[file_path] = b"".join(state.uploads.pop(upload_id))
+                    return "upload_chunk", 200, {"d": self.get_file_entity(file_path)}, None
+                upload_offset = sum(len(chunk) for chunk in state.uploads[upload_id])
+                return "upload_chunk", 200, {"d": {operation: "{}".format(upload_offset)}}, None
+            match = re.match(r"^/moveto\(newurl='(.*)',flags=1\)$", sub_path)
+            if match:
+                state.add_file(match.group(1), state.files.pop(file_path))
+                return "move_file", 200, {"d": {"MoveTo": None}}, None
+            if method == "DELETE":
+                del state.files[file_path]
+                return "delete_file", 200, None, None
+            if file_path not in state.files:
+                raise KeyError(file_path)
+            return "file_properties", 200, {"d": self.get_file_entity(file_path)}, None
+
+    def get_children(self, folder_path, are_files):
+        state = self.server.state
+        paths = state.files if are_files else state.folders
+        prefix = folder_path + "/"
+        children = []
+        for path in sorted(paths):
+            if path.startswith(prefix) and "/" not in path[len(prefix):]:
+                children.append(self.get_file_entity(path) if are_files else self.get_folder_entity(path))
+        return children
+
+    def get_file_entity(self, file_path):
+        return {
+            "__metadata": {"type": "SP.File"},
+            "Exists": True,
+            "Name": file_path.rsplit("/", 1)[-1],
+            "ServerRelativeUrl": file_path,
+            "Length": "{}".format(len(self.server.state.files[file_path])),
+            "TimeLastModified": LAST_MODIFIED
+        }
+
+    def get_folder_entity(self, folder_path):
+        return {
+            "__metadata": {"type": "SP.Folder"},
+            "Exists": True,
+            "Name": folder_path.rsplit("/", 1)[-1],
+            "ServerRelativeUrl": folder_path,
+            "TimeLastModified": LAST_MODIFIED
+        }
+
+    def route_recursive_query(self, body):
+        state = self.server.state
+        query = body["query"]
+        folder_path = state.normalize_path(query["FolderServerRelativeUrl"])
+        page_size = int(re.search(r"<RowLimit Paged='TRUE'>(\d+)</RowLimit>", query["ViewXml"]).group(1))
+        last_id = 0
+        if "ListItemCollectionPosition" in query:
+            last_id = int(re.search(r"p_ID=(\d+)", query["ListItemCollectionPosition"]["PagingInfo"]).group(1))
+        with state.lock:
+            paths = sorted(state.files) + sorted(state.folders)
+            items = []
+            for item_id, path in enumerate(paths, 1):
+                if item_id > last_id and path.startswith(folder_path + "/"):
+                    items.append({
+                        "ID": item_id,
+                        "FileRef": path,
+                        "File_x0020_Size": "{}".format(len(state.files[path])) if path in state.files else "",
+                        "Modified": LAST_MODIFIED,
+                        "FSObjType": "0" if path in state.files else "1"
+                    })
+                    if len(items) >= page_size:
+                        break
+        return "recursive_query", 200, {"d": {"results": items}}, None
+
+    def route_create_field(self, sharepoint_list, body):
+        state = self.server.state
+        schema_xml = json.loads(body.decode("utf-8"))["parameters"]["SchemaXml"]
+        field_title = re.search(r"DisplayName='(.*?)'", schema_xml).group(1)
+        field_type = re.search(r"Type='(.*?)'", schema_xml).group(1)
+        field = state.add_field(sharepoint_list, field_title, field_type)
+        return "create_field", 201, {"d": field}, None
+
+    def route_list(self, method, list_title, sub_path, query, body):
+        state = self.server.state
+        with state.lock:
+            sharepoint_list = state.get_list(list_title)
+            if sharepoint_list is None:
+                raise KeyError(list_title)
+            if sub_path == "":
+                if method == "DELETE":
+                    del state.lists[sharepoint_list["title"].lower()]
+                    return "delete_list", 200, None, None
+                etag = "\"{}\"".format(sharepoint_list["version"])
+                if self.headers.get("If-None-Match") == etag:
+                    return "list_properties", 304, None, {"ETag": etag}
+                entity = {
+                    "__metadata": {"type": "SP.List", "etag": etag},
+                    "ID": LIST_ID,
+                    "Title": sharepoint_list["title"],
+                    "ItemCount": len(sharepoint_list["items"]),
+                    "ListItemEntityTypeFullName": sharepoint_list["entity_type"],
+                    "CurrentChangeToken": {"StringValue": "1;3;{};{}".format(LIST_ID, state.change_counter)}
+                }
+                return "list_properties", 200, {"d": self.select(entity, query)}, {"ETag": etag}
+            if sub_path == "/Fields/CreateFieldAsXml":
+                return self.route_create_field(sharepoint_list, body)
+            if sub_path == "/fields":
+                return "list_fields", 200, self.get_collection(sharepoint_list["fields"], query), None
+            if sub_path == "/GetChanges":
+                return self.route_list_changes(sharepoint_list, json.loads(body.decode("utf-8")))
+            if sub_path == "/Items":
+                if method == "POST":
+                    if not self.is_entity_type_valid(sharepoint_list, body):
+                        return "add_item", 400, self.get_entity_type_error(sharepoint_list), None
+                    values = state.get_stored_values(sharepoint_list, json.loads(body.decode("utf-8")))
+                    return "add_item", 201, {"d": state.add_item(sharepoint_list, values)}, None
+                items = self.get_filtered_items(sharepoint_list, query.get("$filter"))
+                if query.get("$orderby", "").endswith("desc"):
+                    items.reverse()
+                return "list_items", 200, self.get_collection(items, query), None
+            match = re.match(r"^/Items\((\d+)\)$", sub_path)
+            if match:
+                item_id = int(match.group(1))
+                if method == "DELETE":
+                    del sharepoint_list["items"][item_id]
+                    state.record_change(sharepoint_list, item_id, 3)
+                    return "delete_item", 204, None, None
+                if method == "MERGE":
+                    if not self.is_entity_type_valid(sharepoint_list, body):
+                        return "update_item", 400, self.get_entity_type_error(sharepoint_list), None
+                    values = state.get_stored_values(sharepoint_list, json.loads(body.decode("utf-8")))
+                    sharepoint_list["items"][item_id].update(values)
+                    state.record_change(sharepoint_list, item_id, 2)
+                    return "update_item", 204, None, None
+                return "list_item", 200, {"d": self.select(sharepoint_list["items"][item_id], query)}, None
+        raise KeyError(sub_path)
+
+    def get_candidate_items(self, sharepoint_list, filter_clauses):
+        # Like SharePoint with its ID index, an ID range is looked up rather than scanned for
+        items = sharepoint_list["items"]
+        id_bounds = get_id_bounds(filter_clauses)
+        if id_bounds is None:
+            return items.values()
+        return [items[item_id] for item_id in range(*id_bounds) if item_id in items]
+
+    def is_entity_type_valid(self, sharepoint_list, body):
+        item_type = json.loads(body.decode("utf-8")).get("__metadata", {}).get("type")
+        return item_type is None or item_type == sharepoint_list["entity_type"]
+
+    def get_entity_type_error(self, sharepoint_list):
+        return {"error": {"message": {"value": "A type named '{}' could not be resolved by the model.".format(sharepoint_list["entity_type"])}}}
+
+    def get_filtered_items(self, sharepoint_list, filter_query):
+        # Pages of a filtered read all run the same filter, so its result is kept until the list changes
+        cache_key = (filter_query, self.server.state.change_counter)
+        filtered_items = sharepoint_list["filtered_items"].get(cache_key)
+        if filtered_items is None:
+            filter_clauses = parse_filter(filter_query)
+            filtered_items = [item for item in self.get_candidate_items(sharepoint_list, filter_clauses) if is_matching(item, filter_clauses)]
+            if len(sharepoint_list["filtered_items"]) >= 64:
+                sharepoint_list["filtered_items"].clear()
+            sharepoint_list["filtered_items"][cache_key] = filtered_items
+        return list(filtered_items)
+
+    def route_list_changes(self, sharepoint_list, body):
+        change_token = body["query"]["ChangeTokenStart"]["StringValue"]
+        last_change = int(change_token.rsplit(";", 1)[-1])
+        changes = []
+        for change_counter, item_id, change_type in sharepoint_list["changes"]:
+            if change_counter > last_change:
+                changes.append({
+                    "ChangeType": change_type,
+                    "ItemId": item_id,
+                    "ChangeToken": {"StringValue": "1;3;{};{}".format(LIST_ID, change_counter)}
+                })
+                if len(changes) >= 1000:
+                    break
+        return "list_changes", 200, {"d": {"results": changes}}, None
+
+    def get_collection(self, items, query):
+        # One page of items, with a link to the next one as a $skiptoken on the item offset
+        state = self.server.state
+        top = min(int(query.get("$top") or state.page_size), 5000)
+        offset = int(query.get("$skiptoken") or 0)
+        page = [self.select(item, query) for item in items[offset:offset + top]]
+        next_page_url = None
+        if offset + top < len(items):
+            next_query = dict(query, **{"$skiptoken": "{}".format(offset + top)})
+            next_page_url = "{}{}?{}".format(self.server.get_origin(), urllib.parse.urlsplit(self.path).path, urllib.parse.urlencode(next_query))
+        if self.is_nometadata():
+            collection = {"value": page}
+            if next_page_url is not None:
+                collection["odata.nextLink"] = next_page_url
+            return collection
+        collection = {"results": page}
+        if next_page_url is not None:
+            collection["__next"] = next_page_url
+        return {"d": collection}
+
+    def select(self, item, query):
+        selected_columns = [column for column in query.get("$select", "").split(",") if column]
+        if selected_columns:
+            selected_item = {}
+            for column in selected_columns:
+                column_name = column.split("/", 1)[0]
+                if column_name in item:
+                    selected_item[column_name] = item[column_name]
+        else:
+            selected_item = dict((key, value) for key, value in item.items() if key != "__metadata")
+        if self.is_nometadata():
+            return selected_item
+        selected_item["__metadata"] = item.get("__metadata", {"type": "SP.Data.ListItem"})
+        return selected_item
+
+
+def parse_filter(filter_query):
+    # Only handles the filters the plugin sends: comparisons joined by "and" / "or", without nested precedence.
+    # Returns the (column, operator, value) clauses of each alternative.
+    if not filter_query:
+        return None
+    alternatives = []
+    for conjunction in filter_query.replace("(", "").replace(")", "").split(" or "):
+        clauses = []
+        for clause in conjunction.split(" and "):
+            match = re.match(r"^\s*(\S+) (eq|ne|gt|ge|lt|le) (?:datetime)?'?(.*?)'?\s*$", clause)
+            if match is not None:
+                column, comparison, value = match.groups()
+                clauses.append((column.split("/", 1), COMPARATORS[comparison], value))
+        alternatives.append(clauses)
+    return alternatives
+
+
+def get_id_bounds(filter_clauses):
+    # Returns the half open range of IDs a filter of a single alternative with "ID ge" and "ID lt" clauses is limited to
+    if filter_clauses is None or len(filter_clauses) != 1:
+        return None
+    bounds = {}
+    for column, comparator, value in filter_clauses[0]:
+        if column == ["ID"] and comparator in [operator.ge, operator.lt]:
+            bounds[comparator] = int(value)
+    if len(bounds) != 2:
+        return None
+    return bounds[operator.ge], bounds[operator.lt]
+
+
+def is_matching(item, filter_clauses):
+    if filter_clauses is None:
+        return True
+    return any(all(is_clause_matching(item, *clause) for clause in clauses) for clauses in filter_clauses)
+
+
+def is_clause_matching(item, column, comparator, expected_value):
+    value = item.get(column[0])
+    if isinstance(value, dict) and len(column) > 1:
+        value = value.get(column[1])
+    if isinstance(value, (int, float)):
+        expected_value = float(expected_value)
+    elif value is None:
+        value = ""
+    return comparator(value, expected_value)
+
+
+COMPARATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le
+}
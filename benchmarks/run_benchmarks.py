@@ -0,0 +1,327 @@
+"""
+Runs the plugin's file system provider and lists connector against the local mock SharePoint server.
+
+Each scenario runs in its own process, against a mock server running in another one, so that the
+reported peak RSS is the plugin's own. Reports the number of requests, bytes exchanged, wall time
+and peak RSS:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenario list_read --latency 0.02 --page-size 500
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import multiprocessing
+import importlib.util
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path[:0] = [BENCHMARKS_DIR, os.path.join(PLUGIN_DIR, "python-lib")]
+
+from mock_sharepoint import MockSharePointState, MockSharePointServer  # noqa: E402
+
+SITE = "bench"
+LIST_TITLE = "benchlist"
+LIST_COLUMNS = ["Title", "Category", "Amount", "Comment"]
+
+
+def install_dataiku_shim():
+    # Outside of DSS, the plugin only needs the base classes of its provider and connector
+    try:
+        importlib.import_module("dataiku.fsprovider")
+        importlib.import_module("dataiku.connector")
+        return
+    except ImportError:
+        pass
+    import types
+
+    class FSProvider(object):
+        def __init__(self, root, config, plugin_config):
+            pass
+
+    class Connector(object):
+        def __init__(self, config, plugin_config):
+            self.config = config
+            self.plugin_config = plugin_config
+
+    dataiku_module = types.ModuleType("dataiku")
+    dataiku_module.fsprovider = types.ModuleType("dataiku.fsprovider")
+    dataiku_module.fsprovider.FSProvider = FSProvider
+    dataiku_module.connector = types.ModuleType("dataiku.connector")
+    dataiku_module.connector.Connector = Connector
+    sys.modules.update({
+        "dataiku": dataiku_module,
+        "dataiku.fsprovider": dataiku_module.fsprovider,
+        "dataiku.connector": dataiku_module.connector
+    })
+
+
+def load_plugin_module(name, relative_path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PLUGIN_DIR, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_config(origin, **params):
+    config = {
+        "sharepoint_local": {
+            "sharepoint_host": origin,
+            "sharepoint_site": SITE,
+            "sharepoint_username": "bench",
+            "sharepoint_password": "bench",
+            "pool_size": params.pop("pool_size", 10)
+        },
+        "sharepoint_list_title": LIST_TITLE
+    }
+    config.update(params)
+    return config
+
+
+class CountingSink(object):
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+class GeneratedStream(object):
+    # File like source of size bytes, without holding them in memory
+    def __init__(self, size):
+        self.bytes_left = size
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.bytes_left
+        size = min(size, self.bytes_left)
+        self.bytes_left -= size
+        return b"x" * size
+
+
+def get_provider(origin, **params):
+    fs_provider = load_plugin_module("fs_provider", "python-fs-providers/sharepoint-server_shared-documents/fs-provider.py")
+    return fs_provider.SharePointFSProvider("/", get_config(origin, **params), {})
+
+
+def get_connector(origin, **params):
+    connector = load_plugin_module("connector", "python-connectors/sharepoint-server_lists/connector.py")
+    return connector.SharePointListsConnector(get_config(origin, **params), {})
+
+
+def setup_tree(state, scale):
+    state.add_tree("/tree", depth=3, breadth=4, files_per_folder=5 * scale, file_size=128)
+
+
+def setup_browse(state, scale):
+    state.add_tree("/wide", depth=1, breadth=20 * scale, files_per_folder=20 * scale, file_size=128)
+
+
+def run_browse(origin, scale):
+    provider = get_provider(origin)
+    for folder_index in range(20 * scale):
+        provider.browse("/wide/folder_{}".format(folder_index))
+    provider.browse("/wide")
+
+
+def setup_stat(state, scale):
+    state.add_tree("/stat", depth=0, breadth=0, files_per_folder=200 * scale, file_size=128)
+
+
+def run_stat(origin, scale):
+    provider = get_provider(origin)
+    for file_index in range(200 * scale):
+        provider.stat("/stat/file_{}.csv".format(file_index))
+
+
+def run_enumerate(origin, scale):
+    get_provider(origin).enumerate("/tree", False)
+
+
+def run_enumerate_query(origin, scale):
+    get_provider(origin, enumeration_mode="recursive_query").enumerate("/tree", False)
+
+
+def setup_read_big(state, scale):
+    state.add_file(state.get_root_path() + "/big/file.bin", b"x" * (64 * 1024 * 1024 * scale))
+
+
+def run_read_big(origin, scale):
+    get_provider(origin).read("/big/file.bin", CountingSink(), None)
+
+
+def setup_nothing(state, scale):
+    pass
+
+
+def run_write_big(origin, scale):
+    get_provider(origin).write("/upload/deep/folder/file.bin", GeneratedStream(64 * 1024 * 1024 * scale))
+
+
+def setup_list(state, scale):
+    state.add_list(LIST_TITLE, item_count=20000 * scale, columns=LIST_COLUMNS)
+
+
+def run_list_read(origin, scale, **params):
+    connector = get_connector(origin, **params)
+    for row in connector.generate_rows(records_limit=-1):
+        pass
+
+
+def run_list_read_sharded(origin, scale):
+    run_list_read(origin, scale, read_strategy="sharded", shard_count=4)
+
+
+def run_list_read_keyset(origin, scale):
+    run_list_read(origin, scale, pagination="keyset", page_size=5000)
+
+
+def run_list_preview(origin, scale):
+    connector = get_connector(origin)
+    for row in connector.generate_rows(records_limit=100):
+        pass
+
+
+def setup_list_upsert(state, scale):
+    state.add_list(LIST_TITLE, item_count=5000 * scale, columns=LIST_COLUMNS)
+
+
+def run_list_write(origin, scale, **params):
+    connector = get_connector(origin, **params)
+    writer = connector.get_writer(dataset_schema={"columns": [{"name": column, "type": "string"} for column in LIST_COLUMNS]})
+    for row_index in range(5000 * scale):
+        # Same values as the items created by setup_list_upsert, with one row in ten changed
+        row = ["{}_{}".format(column, row_index) for column in LIST_COLUMNS]
+        if row_index % 10 == 0:
+            row[0] = "changed"
+        writer.write_row(row)
+    writer.close()
+
+
+def run_list_upsert(origin, scale):
+    run_list_write(origin, scale, write_mode="upsert", upsert_key_column="Category")
+
+
+# name, setup of the mock server's state, code measured against it
+SCENARIOS = [
+    ("browse", setup_browse, run_browse),
+    ("stat", setup_stat, run_stat),
+    ("enumerate", setup_tree, run_enumerate),
+    ("enumerate_query", setup_tree, run_enumerate_query),
+    ("read_big", setup_read_big, run_read_big),
+    ("write_big", setup_nothing, run_write_big),
+    ("list_read", setup_list, run_list_read),
+    ("list_read_sharded", setup_list, run_list_read_sharded),
+    ("list_read_keyset", setup_list, run_list_read_keyset),
+    ("list_preview", setup_list, run_list_preview),
+    ("list_write", setup_nothing, run_list_write),
+    ("list_upsert", setup_list_upsert, run_list_upsert)
+]
+
+
+def serve_mock(setup, args, connection):
+    # Runs in its own process, so that the files and lists held by the mock do not count in the measured peak RSS
+    state = MockSharePointState(site=SITE, page_size=args.page_size)
+    setup(state, args.scale)
+    server = MockSharePointServer(state)
+    server.start()
+    connection.send(server.get_origin())
+    try:
+        while connection.recv() != "stop":
+            state.latency = args.latency
+            state.throttling_rate = args.throttling_rate
+            state.reset_counters()
+            connection.send(None)
+        connection.send(state.get_counters())
+    finally:
+        server.stop()
+
+
+def run_scenario(name, args):
+    install_dataiku_shim()
+    setup, run = dict((scenario[0], scenario[1:]) for scenario in SCENARIOS)[name]
+    connection, mock_connection = multiprocessing.Pipe()
+    mock_process = multiprocessing.Process(target=serve_mock, args=(setup, args, mock_connection))
+    mock_process.daemon = True
+    mock_process.start()
+    try:
+        origin = connection.recv()
+        connection.send("start")
+        connection.recv()
+        start_time = time.time()
+        run(origin, args.scale)
+        wall_time = time.time() - start_time
+        connection.send("stop")
+        result = connection.recv()
+    finally:
+        mock_process.join(timeout=10)
+        if mock_process.is_alive():
+            mock_process.terminate()
+    result.update({
+        "scenario": name,
+        "wall_time": round(wall_time, 3),
+        # kilobytes on Linux, this process only runs the plugin's code
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    })
+    return result
+
+
+def print_results(results):
+    print("{:<20} {:>9} {:>10} {:>12} {:>12} {:>10} {:>12}".format(
+        "scenario", "requests", "throttled", "bytes out", "bytes in", "wall (s)", "peak RSS (MB)"
+    ))
+    for result in results:
+        print("{:<20} {:>9} {:>10} {:>12} {:>12} {:>10} {:>12}".format(
+            result["scenario"],
+            result["requests"],
+            result["throttled_requests"],
+            result["bytes_received"],
+            result["bytes_sent"],
+            result["wall_time"],
+            result["peak_rss_mb"]
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SharePoint plugin against a local mock server")
+    parser.add_argument("--scenario", action="append", choices=[scenario[0] for scenario in SCENARIOS],
+                        help="Scenario to run, can be repeated. All of them by default")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--page-size", type=int, default=100, help="Items per page when the client does not set $top")
+    parser.add_argument("--throttling-rate", type=float, default=0.0, help="Share of the requests answered with a 429")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier of the scenario sizes")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON lines")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    scenario_names = args.scenario or [scenario[0] for scenario in SCENARIOS]
+
+    if args.in_process:
+        for name in scenario_names:
+            print(json.dumps(run_scenario(name, args)))
+        return
+
+    results = []
+    for name in scenario_names:
+        command = [
+            sys.executable, os.path.abspath(__file__), "--in-process", "--json",
+            "--scenario", name,
+            "--latency", "{}".format(args.latency),
+            "--page-size", "{}".format(args.page_size),
+            "--throttling-rate", "{}".format(args.throttling_rate),
+            "--scale", "{}".format(args.scale)
+        ]
+        output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout.decode("utf-8")
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,13 @@ import logging
 
 from sharepoint_client import SharePointClient
 from sharepoint_constants import SharePointConstants
-from sharepoint_lists import assert_list_title, is_response_empty, extract_results, get_dss_type, is_error
-from sharepoint_lists import SharePointListWriter, matched_item, expand_matched_item
+from sharepoint_lists import assert_list_title, is_response_empty, extract_results, get_dss_type
+from sharepoint_lists import SharePointListWriter, get_projection, get_projection_columns, project_item
+from sharepoint_lists import get_partition_filter, get_partition_id, get_lookup_field, get_fields_by_name
+from sharepoint_lists import get_id_shards, get_id_ranges, get_id_shard_filter
+from sharepoint_incremental import IncrementalReadState, get_changed_item_ids
+from sharepoint_streaming import is_streaming_available
+from common import prefetch, prefetch_buffered, get_int_parameter, map_ordered, BufferedIterator
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -22,36 +27,57 @@ class SharePointListsConnector(Connector):
         self.column_ids = {}
         self.column_names = {}
         self.expand_lookup = config.get("expand_lookup", False)
+        self.projection = ()
         self.column_to_expand = {}
+        self.read_mode = config.get("read_mode", SharePointConstants.READ_MODE_FULL)
+        self.incremental_state_folder = config.get("incremental_state_folder")
+        self.partitioning_type = config.get("partitioning_type", SharePointConstants.PARTITIONING_NONE)
+        self.partitioning_column = config.get("partitioning_column")
+        self.partitioning_period = config.get("partitioning_period", SharePointConstants.DEFAULT_PARTITIONING_PERIOD)
+        self.records_count_mode = config.get("records_count_mode", SharePointConstants.RECORDS_COUNT_ITEM_COUNT)
+        self.streaming_decode = config.get("streaming_decode", True)
+        if self.streaming_decode and not is_streaming_available():
+            logger.warning("ijson is not installed, list pages will be decoded whole")
+            self.streaming_decode = False
+        self.read_strategy = config.get("read_strategy", SharePointConstants.READ_STRATEGY_SEQUENTIAL)
+        self.shard_count = max(1, get_int_parameter(config, "shard_count", SharePointConstants.DEFAULT_SHARD_COUNT))
+        self.shard_ordering = config.get("shard_ordering", SharePointConstants.SHARD_ORDERING_DETERMINISTIC)
+        self.fields = {}
+        self.field_names = {}
         self.client = SharePointClient(config)
 
     def get_read_schema(self):
         logger.info('get_read_schema')
         response = self.client.get_list_fields(self.sharepoint_list_title)
-        if is_response_empty(response) or len(response[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]) < 1:
+        if is_response_empty(response) or len(extract_results(response)) < 1:
             return None
+        fields = extract_results(response)
+        # Read only fields such as Modified are not part of the schema but can still partition the list
+        self.fields, self.field_names = get_fields_by_name(fields)
+        self.projection = get_projection(fields, self.expand_lookup)
+        self.column_to_expand = get_projection_columns(self.projection)
         columns = []
         self.column_ids = {}
         self.column_names = {}
-        has_expandable_columns = False
-        for column in extract_results(response):
-            if (not column[SharePointConstants.HIDDEN_COLUMN]) and (not column[SharePointConstants.READ_ONLY_FIELD]):
-                sharepoint_type = get_dss_type(column[SharePointConstants.TYPE_AS_STRING])
+        for field in fields:
+            if (not field[SharePointConstants.HIDDEN_COLUMN]) and (not field[SharePointConstants.READ_ONLY_FIELD]):
+                sharepoint_type = get_dss_type(field[SharePointConstants.TYPE_AS_STRING])
                 if sharepoint_type is not None:
                     columns.append({
-                        SharePointConstants.NAME_COLUMN: column[SharePointConstants.TITLE_COLUMN],
+                        SharePointConstants.NAME_COLUMN: field[SharePointConstants.TITLE_COLUMN],
                         SharePointConstants.TYPE_COLUMN: sharepoint_type
                     })
-                    self.column_ids[column[SharePointConstants.ENTITY_PROPERTY_NAME]] = sharepoint_type
-                    self.column_names[column[SharePointConstants.ENTITY_PROPERTY_NAME]] = column[SharePointConstants.TITLE_COLUMN]
-                    if self.expand_lookup:
-                        if column[SharePointConstants.TYPE_AS_STRING] == "Lookup":
-                            self.column_to_expand.update({column[SharePointConstants.STATIC_NAME]: column[SharePointConstants.LOOKUP_FIELD]})
-                            has_expandable_columns = True
-                        else:
-                            self.column_to_expand.update({column[SharePointConstants.STATIC_NAME]: None})
-        if not has_expandable_columns:
-            self.column_to_expand = {}
+                    self.column_ids[field[SharePointConstants.ENTITY_PROPERTY_NAME]] = sharepoint_type
+                    self.column_names[field[SharePointConstants.ENTITY_PROPERTY_NAME]] = field[SharePointConstants.TITLE_COLUMN]
+        if self.read_mode == SharePointConstants.READ_MODE_INCREMENTAL_DELTA:
+            columns.append({
+                SharePointConstants.NAME_COLUMN: SharePointConstants.ITEM_ID_COLUMN,
+                SharePointConstants.TYPE_COLUMN: "int"
+            })
+            columns.append({
+                SharePointConstants.NAME_COLUMN: SharePointConstants.CHANGE_TYPE_COLUMN,
+                SharePointConstants.TYPE_COLUMN: "string"
+            })
         return {
             SharePointConstants.COLUMNS: columns
         }
@@ -65,37 +91,225 @@ class SharePointListsConnector(Connector):
             dataset_schema, dataset_partitioning, partition_id
         ))
 
-        response = self.client.get_list_all_items(self.sharepoint_list_title, column_to_expand=self.column_to_expand)
-        if is_response_empty(response):
-            if is_error(response):
-                raise Exception("Error: {}".format(response[SharePointConstants.ERROR_CONTAINER][SharePointConstants.MESSAGE][SharePointConstants.VALUE]))
-            else:
-                raise Exception("Error when interacting with SharePoint")
+        filter_query, filter_expand = None, None
+        if self.is_partitioned() and partition_id is not None:
+            filter_query, filter_expand = self.get_partition_filter(partition_id)
+        elif self.read_mode != SharePointConstants.READ_MODE_FULL:
+            for row in self.generate_incremental_rows(records_limit):
+                yield row
+            return
 
-        if self.column_to_expand is None:
-            for item in extract_results(response):
-                yield matched_item(self.column_ids, self.column_names, item)
+        items = self.get_items(self.column_to_expand, filter_query, filter_expand, records_limit)
+        for item in items:
+            yield self.get_row(item)
+
+    def get_items(self, column_to_expand, filter_query=None, filter_expand=None, records_limit=None):
+        is_limited = records_limit is not None and records_limit > 0
+        if self.read_strategy == SharePointConstants.READ_STRATEGY_SHARDED and self.shard_count > 1 and not is_limited:
+            return self.get_sharded_items(column_to_expand, filter_query, filter_expand)
+        if self.streaming_decode:
+            return prefetch_buffered(
+                self.get_item_stream(column_to_expand, filter_query, filter_expand, records_limit),
+                SharePointConstants.STREAMING_BUFFER_SIZE
+            )
+        pages = prefetch(self.client.get_list_pages(
+            self.sharepoint_list_title,
+            column_to_expand=column_to_expand,
+            filter_query=filter_query,
+            filter_expand=filter_expand,
+            records_limit=records_limit
+        ))
+        return (item for page in pages for item in page)
+
+    def get_item_stream(self, column_to_expand, filter_query=None, filter_expand=None, records_limit=None):
+        if self.streaming_decode:
+            return self.client.get_list_item_stream(
+                self.sharepoint_list_title,
+                column_to_expand=column_to_expand,
+                filter_query=filter_query,
+                filter_expand=filter_expand,
+                records_limit=records_limit
+            )
+        pages = self.client.get_list_pages(
+            self.sharepoint_list_title,
+            column_to_expand=column_to_expand,
+            filter_query=filter_query,
+            filter_expand=filter_expand,
+            records_limit=records_limit
+        )
+        return (item for page in pages for item in page)
+
+    def get_sharded_items(self, column_to_expand, filter_query=None, filter_expand=None):
+        id_range = self.client.get_list_id_range(self.sharepoint_list_title, filter_query=filter_query, filter_expand=filter_expand)
+        if id_range is None:
+            return
+        if self.shard_ordering == SharePointConstants.SHARD_ORDERING_UNORDERED:
+            shards = get_id_shards(id_range[0], id_range[1], self.shard_count)
+            logger.info("get_sharded_items:reading IDs {} to {} in {} shards".format(id_range[0], id_range[1], len(shards)))
+            shard_streams = [
+                self.get_item_stream(column_to_expand, get_id_shard_filter(shard, filter_query), filter_expand)
+                for shard in shards
+            ]
+            buffered_shards = BufferedIterator(shard_streams, SharePointConstants.SHARD_BUFFER_SIZE)
+            try:
+                for item in buffered_shards:
+                    yield item
+            finally:
+                buffered_shards.close()
+            return
+
+        # Reading a few large shards in order would leave all but the first one waiting on a full buffer,
+        # so the IDs are split in many narrow ranges, read by shard_count workers a bounded window ahead
+        id_ranges = get_id_ranges(id_range[0], id_range[1], SharePointConstants.SHARD_RANGE_WIDTH)
+        logger.info("get_sharded_items:reading IDs {} to {} in {} ranges".format(id_range[0], id_range[1], len(id_ranges)))
+        range_items = map_ordered(
+            lambda shard: list(self.get_item_stream(column_to_expand, get_id_shard_filter(shard, filter_query), filter_expand)),
+            id_ranges,
+            self.shard_count,
+            2 * self.shard_count
+        )
+        try:
+            for items in range_items:
+                for item in items:
+                    yield item
+        finally:
+            range_items.close()
+
+    def get_row(self, item):
+        return project_item(self.projection, item)
+
+    def generate_incremental_rows(self, records_limit):
+        state = IncrementalReadState(
+            self.incremental_state_folder,
+            "{}/{}/{}/{}".format(self.client.sharepoint_origin, self.client.sharepoint_site, self.sharepoint_list_title, self.read_mode),
+            sorted(self.column_names.values())
+        )
+        state.load()
+        column_to_expand = dict(self.column_to_expand, **{SharePointConstants.ID: None})
+        # Taken before reading, so changes made during the read are read again next time rather than missed
+        change_token = self.client.get_list_change_token(self.sharepoint_list_title)
+
+        changed_items = None
+        deleted_items = set()
+        if state.change_token is not None:
+            try:
+                changed_items, deleted_items = get_changed_item_ids(
+                    self.client.get_list_changes(self.sharepoint_list_title, state.change_token)
+                )
+            except Exception as error:
+                logger.warning("Could not get the changes since the last read, reading the whole list instead: {}".format(error))
+        if changed_items is None:
+            logger.info("generate_incremental_rows:reading the whole list")
+            state.rows = {}
+            items = self.get_items(column_to_expand, records_limit=records_limit)
+        else:
+            logger.info("generate_incremental_rows:{} items changed, {} deleted".format(len(changed_items), len(deleted_items)))
+            for item_id in deleted_items:
+                state.rows.pop(str(item_id), None)
+            items = self.client.get_list_items_by_ids(
+                self.sharepoint_list_title,
+                sorted(changed_items),
+                column_to_expand=column_to_expand
+            )
+
+        if self.read_mode == SharePointConstants.READ_MODE_INCREMENTAL_DELTA:
+            for item in items:
+                row = self.get_row(item)
+                item_id = item.get(SharePointConstants.ID)
+                row[SharePointConstants.ITEM_ID_COLUMN] = item_id
+                row[SharePointConstants.CHANGE_TYPE_COLUMN] = SharePointConstants.CHANGE_ADDED if changed_items is None else changed_items.get(item_id)
+                yield row
+            for item_id in sorted(deleted_items):
+                yield {
+                    SharePointConstants.ITEM_ID_COLUMN: item_id,
+                    SharePointConstants.CHANGE_TYPE_COLUMN: SharePointConstants.CHANGE_DELETED
+                }
         else:
-            for item in extract_results(response):
-                yield expand_matched_item(self.column_ids, self.column_names, item, column_to_expand=self.column_to_expand)
+            for item in items:
+                state.rows[str(item.get(SharePointConstants.ID))] = self.get_row(item)
+            for row in state.rows.values():
+                yield row
+
+        # Samples and previews must not consume the changes
+        if records_limit is None or records_limit < 0:
+            state.change_token = change_token
+            state.save()
 
     def get_writer(self, dataset_schema=None, dataset_partitioning=None,
                    partition_id=None):
         assert_list_title(self.sharepoint_list_title)
         return SharePointListWriter(self.config, self, dataset_schema, dataset_partitioning, partition_id)
 
+    def is_partitioned(self):
+        return self.partitioning_type != SharePointConstants.PARTITIONING_NONE and bool(self.partitioning_column)
+
+    def get_field(self, name):
+        # Columns are designated by their title, or by their internal name
+        if not self.fields:
+            self.get_read_schema()
+        return self.fields.get(self.field_names.get(name, name))
+
+    def get_partitioning_field(self):
+        field = self.get_field(self.partitioning_column)
+        if field is None:
+            raise Exception("Partitioning column '{}' does not exist in list '{}'".format(self.partitioning_column, self.sharepoint_list_title))
+        return field
+
+    def get_partition_filter(self, partition_id):
+        return get_partition_filter(self.get_partitioning_field(), self.partitioning_type, self.partitioning_period, partition_id)
+
     def get_partitioning(self):
         logger.info('get_partitioning')
-        raise Exception("Unimplemented")
+        if not self.is_partitioned():
+            raise Exception("Unimplemented")
+        dimension = {
+            "name": self.partitioning_column,
+            "type": "value"
+        }
+        if self.partitioning_type == SharePointConstants.PARTITIONING_TIME:
+            dimension = {
+                "name": self.partitioning_column,
+                "type": "time",
+                "params": {"period": self.partitioning_period}
+            }
+        return {
+            "dimensions": [dimension]
+        }
 
     def list_partitions(self, partitioning):
         logger.info('list_partitions:partitioning={}'.format(partitioning))
-        return []
+        if not self.is_partitioned():
+            return []
+        field = self.get_partitioning_field()
+        internal_name = field[SharePointConstants.ENTITY_PROPERTY_NAME]
+        lookup_field = None
+        if field[SharePointConstants.TYPE_AS_STRING] in SharePointConstants.LOOKUP_TYPES:
+            lookup_field = get_lookup_field(field)
+        partition_ids = set()
+        pages = prefetch(self.client.get_list_pages(
+            self.sharepoint_list_title,
+            column_to_expand={internal_name: lookup_field}
+        ))
+        for page in pages:
+            for item in page:
+                partition_id = get_partition_id(field, self.partitioning_type, self.partitioning_period, item.get(internal_name))
+                if partition_id is not None:
+                    partition_ids.add(partition_id)
+        return sorted(partition_ids)
 
     def partition_exists(self, partitioning, partition_id):
         logger.info('partition_exists:partitioning={}, partition_id={}'.format(partitioning, partition_id))
-        raise Exception("unimplemented")
+        if not self.is_partitioned():
+            raise Exception("unimplemented")
+        filter_query, filter_expand = self.get_partition_filter(partition_id)
+        return self.client.has_list_items(self.sharepoint_list_title, filter_query=filter_query, filter_expand=filter_expand)
 
     def get_records_count(self, partitioning=None, partition_id=None):
         logger.info('get_records_count:partitioning={}, partition_id={}'.format(partitioning, partition_id))
-        raise Exception("unimplemented")
+        if self.is_partitioned() and partition_id is not None:
+            # ItemCount only covers the whole list, a partition has to be counted on its IDs
+            filter_query, filter_expand = self.get_partition_filter(partition_id)
+            return self.client.count_list_items(self.sharepoint_list_title, filter_query=filter_query, filter_expand=filter_expand)
+        if self.records_count_mode == SharePointConstants.RECORDS_COUNT_SCAN:
+            return self.client.count_list_items(self.sharepoint_list_title)
+        return self.client.get_list_item_count(self.sharepoint_list_title)
@@ -4,12 +4,14 @@ import os
 import shutil
 import logging
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 from sharepoint_client import SharePointClient
 from dss_constants import DSSConstants
 from sharepoint_constants import SharePointConstants
-from sharepoint_items import has_sharepoint_items, extract_item_from, get_last_modified, get_size, get_name
-from sharepoint_items import loop_sharepoint_items, assert_path_is_not_root, create_path
-from common import get_rel_path, get_lnt_path
+from sharepoint_items import extract_item_from, get_last_modified, get_size, get_name
+from sharepoint_items import loop_sharepoint_items, assert_path_is_not_root, create_path, forget_folder_tree
+from common import get_rel_path, get_lnt_path, get_int_parameter
 
 try:
     from BytesIO import BytesIO  # for Python 2
@@ -37,6 +39,9 @@ class SharePointFSProvider(FSProvider):
         logger.info('init:root={}'.format(self.root))
 
         self.client = SharePointClient(config)
+        self.known_folders = set()
+        self.enumeration_mode = config.get("enumeration_mode", SharePointConstants.ENUMERATION_MODE_FOLDERS)
+        self.upload_chunk_size = get_int_parameter(config, "upload_chunk_size", SharePointConstants.DEFAULT_UPLOAD_CHUNK_SIZE) * 1024 * 1024
 
     # util methods
     def get_full_path(self, path):
@@ -46,34 +51,21 @@ class SharePointFSProvider(FSProvider):
 
     def close(self):
         logger.info('close')
+        self.client.close()
 
     def stat(self, path):
         full_path = get_lnt_path(self.get_full_path(path))
         logger.info('stat:path="{}", full_path="{}"'.format(path, full_path))
-        files = self.client.get_files(full_path)
-        folders = self.client.get_folders(full_path)
-
-        if has_sharepoint_items(files) or has_sharepoint_items(folders):
-            return {
-                DSSConstants.PATH: get_lnt_path(path),
-                DSSConstants.SIZE: 0,
-                DSSConstants.IS_DIRECTORY: True
-            }
-
-        path_to_item, item_name = os.path.split(full_path)
-        files = self.client.get_files(path_to_item)
-        folders = self.client.get_folders(path_to_item)
-
-        file = extract_item_from(item_name, files)
-        folder = extract_item_from(item_name, folders)
-
+        folder = self.client.get_folder_properties(full_path)
         if folder is not None:
+            self.known_folders.add(full_path)
             return {
                 DSSConstants.PATH: get_lnt_path(path),
                 DSSConstants.SIZE: 0,
                 DSSConstants.LAST_MODIFIED: get_last_modified(folder),
                 DSSConstants.IS_DIRECTORY: True
             }
+        file = self.client.get_file_properties(full_path)
         if file is not None:
             return {
                 DSSConstants.PATH: get_lnt_path(path),
@@ -106,6 +98,7 @@ class SharePointFSProvider(FSProvider):
                 DSSConstants.LAST_MODIFIED: get_last_modified(file)
             })
         for folder in loop_sharepoint_items(folders):
+            self.known_folders.add(get_lnt_path(os.path.join(full_path, get_name(folder))))
             children.append({
                 DSSConstants.FULL_PATH: get_lnt_path(os.path.join(path, get_name(folder))),
                 DSSConstants.EXISTS: True,
@@ -121,23 +114,17 @@ class SharePointFSProvider(FSProvider):
                 DSSConstants.DIRECTORY: True,
                 DSSConstants.CHILDREN: children
             }
-        path_to_file, file_name = os.path.split(full_path)
-
-        files = self.client.get_files(path_to_file)
+        file = self.client.get_file_properties(full_path)
+        if file is not None:
+            return {
+                DSSConstants.FULL_PATH: get_lnt_path(path),
+                DSSConstants.EXISTS: True,
+                DSSConstants.SIZE: get_size(file),
+                DSSConstants.LAST_MODIFIED: get_last_modified(file),
+                DSSConstants.DIRECTORY: False
+            }
 
-        for file in loop_sharepoint_items(files):
-            if get_name(file) == file_name:
-                return {
-                    DSSConstants.FULL_PATH: get_lnt_path(path),
-                    DSSConstants.EXISTS: True,
-                    DSSConstants.SIZE: get_size(file),
-                    DSSConstants.LAST_MODIFIED: get_last_modified(file),
-                    DSSConstants.DIRECTORY: False
-                }
-
-        parent_path, item_name = os.path.split(full_path)
-        folders = self.client.get_folders(parent_path)
-        folder = extract_item_from(item_name, folders)
+        folder = self.client.get_folder_properties(full_path)
         if folder is None:
             ret = {
                 DSSConstants.FULL_PATH: None,
@@ -156,23 +143,13 @@ class SharePointFSProvider(FSProvider):
         path = get_rel_path(path)
         full_path = get_lnt_path(self.get_full_path(path))
         logger.info('enumerate:path={},fullpath={}'.format(path, full_path))
-        path_to_item, item_name = os.path.split(full_path)
-        ret = self.list_recursive(path, full_path, first_non_empty)
-        return ret
+        if self.enumeration_mode == SharePointConstants.ENUMERATION_MODE_RECURSIVE_QUERY:
+            return self.list_recursive_query(path, full_path, first_non_empty)
+        return self.list_recursive(path, full_path, first_non_empty)
 
-    def list_recursive(self, path, full_path, first_non_empty):
+    def list_recursive_query(self, path, full_path, first_non_empty):
         paths = []
-        folders = self.client.get_folders(full_path)
-        for folder in loop_sharepoint_items(folders):
-            paths.extend(
-                self.list_recursive(
-                    get_lnt_path(os.path.join(path, get_name(folder))),
-                    get_lnt_path(os.path.join(full_path, get_name(folder))),
-                    first_non_empty
-                )
-            )
-        files = self.client.get_files(full_path)
-        for file in loop_sharepoint_items(files):
+        for file in self.client.get_recursive_files(full_path):
             paths.append({
                 DSSConstants.PATH: get_lnt_path(os.path.join(path, get_name(file))),
                 DSSConstants.LAST_MODIFIED: get_last_modified(file),
@@ -182,6 +159,40 @@ class SharePointFSProvider(FSProvider):
                 return paths
         return paths
 
+    def list_recursive(self, path, full_path, first_non_empty):
+        # Breadth first walk, sibling folders being listed in parallel by a pool
+        # no larger than the client's connection pool
+        paths = []
+        executor = ThreadPoolExecutor(max_workers=self.client.pool_size)
+        pending_listings = {executor.submit(self.list_folder, full_path): (path, full_path)}
+        try:
+            while pending_listings:
+                done, not_done = wait(pending_listings, return_when=FIRST_COMPLETED)
+                for listing in done:
+                    folder_path, folder_full_path = pending_listings.pop(listing)
+                    folders, files = listing.result()
+                    for file in loop_sharepoint_items(files):
+                        paths.append({
+                            DSSConstants.PATH: get_lnt_path(os.path.join(folder_path, get_name(file))),
+                            DSSConstants.LAST_MODIFIED: get_last_modified(file),
+                            DSSConstants.SIZE: get_size(file)
+                        })
+                        if first_non_empty:
+                            return paths
+                    for folder in loop_sharepoint_items(folders):
+                        sub_path = get_lnt_path(os.path.join(folder_path, get_name(folder)))
+                        sub_full_path = get_lnt_path(os.path.join(folder_full_path, get_name(folder)))
+                        self.known_folders.add(sub_full_path)
+                        pending_listings[executor.submit(self.list_folder, sub_full_path)] = (sub_path, sub_full_path)
+            return paths
+        finally:
+            for listing in pending_listings:
+                listing.cancel()
+            executor.shutdown(wait=False)
+
+    def list_folder(self, full_path):
+        return self.client.get_folders(full_path), self.client.get_files(full_path)
+
     def delete_recursive(self, path):
         full_path = self.get_full_path(path)
         logger.info('delete_recursive:path={},fullpath={}'.format(path, full_path))
@@ -201,6 +212,7 @@ class SharePointFSProvider(FSProvider):
 
         if folder is not None:
             self.client.delete_folder(get_lnt_path(full_path))
+            forget_folder_tree(self.known_folders, full_path)
             return 1
 
         return 0
@@ -217,17 +229,29 @@ class SharePointFSProvider(FSProvider):
         full_path = self.get_full_path(path)
         logger.info('read:full_path={}'.format(full_path))
 
-        response = self.client.get_file_content(full_path)
-        bio = BytesIO(response.content)
-        shutil.copyfileobj(bio, stream)
+        response = self.client.get_file_content(full_path, stream=True)
+        bytes_left = limit if limit is not None and limit > 0 else None
+        try:
+            for chunk in response.iter_content(chunk_size=SharePointConstants.FILE_CHUNK_SIZE):
+                if bytes_left is not None:
+                    chunk = chunk[:bytes_left]
+                    bytes_left -= len(chunk)
+                stream.write(chunk)
+                if bytes_left == 0:
+                    break
+        finally:
+            response.close()
 
     def write(self, path, stream):
         full_path = self.get_full_path(path)
         logger.info('write:path="{}", full_path="{}"'.format(path, full_path))
-        bio = BytesIO()
-        shutil.copyfileobj(stream, bio)
-        bio.seek(0)
-        data = bio.read()
-        create_path(self.client, full_path)
-        response = self.client.write_file_content(full_path, data)
+        create_path(self.client, full_path, self.known_folders)
+        if self.upload_chunk_size > 0:
+            response = self.client.write_file_content_chunked(full_path, stream, self.upload_chunk_size)
+        else:
+            bio = BytesIO()
+            shutil.copyfileobj(stream, bio)
+            bio.seek(0)
+            data = bio.read()
+            response = self.client.write_file_content(full_path, data)
         logger.info("write:response={}".format(response))
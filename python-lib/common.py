@@ -1,3 +1,13 @@
+import queue
+import threading
+import itertools
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sharepoint_constants import SharePointConstants
+
+
 def get_rel_path(path):
     if len(path) > 0 and path[0] == '/':
         path = path[1:]
@@ -19,3 +29,142 @@ def get_from_json_path(path, json_object):
         if edge is None:
             return None
     return edge
+
+
+# Responses come either in the verbose shape, {"d": {"results": [...], "__next": url}} or {"d": {...}},
+# or in the nometadata shape, {"value": [...], "odata.nextLink": url} or {...}
+
+
+def get_results(response):
+    if SharePointConstants.RESULTS_CONTAINER_V2 in response:
+        container = response[SharePointConstants.RESULTS_CONTAINER_V2]
+        return container.get(SharePointConstants.RESULTS) if isinstance(container, dict) else None
+    return response.get(SharePointConstants.VALUE)
+
+
+def get_next_page_url(response):
+    if SharePointConstants.RESULTS_CONTAINER_V2 in response:
+        return response[SharePointConstants.RESULTS_CONTAINER_V2].get(SharePointConstants.NEXT_PAGE)
+    return response.get(SharePointConstants.NEXT_LINK)
+
+
+def get_entity(response):
+    return response.get(SharePointConstants.RESULTS_CONTAINER_V2, response)
+
+
+def get_int_parameter(config, key, default):
+    value = config.get(key)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def read_chunk(stream, chunk_size):
+    parts = []
+    bytes_read = 0
+    while bytes_read < chunk_size:
+        data = stream.read(chunk_size - bytes_read)
+        if not data:
+            break
+        parts.append(data)
+        bytes_read += len(data)
+    return b"".join(parts)
+
+
+def prefetch(iterator):
+    # Yields the elements of iterator while the next one is computed on a background thread,
+    # so at most two elements are held in memory at once
+    executor = ThreadPoolExecutor(max_workers=1)
+    end_of_iterator = object()
+    try:
+        future = executor.submit(next, iterator, end_of_iterator)
+        while True:
+            element = future.result()
+            if element is end_of_iterator:
+                return
+            future = executor.submit(next, iterator, end_of_iterator)
+            yield element
+    finally:
+        executor.shutdown(wait=False)
+
+
+def prefetch_buffered(iterator, buffer_size):
+    # Yields the elements of iterator while a background thread keeps up to buffer_size of them ready.
+    # Meant for fine grained iterators where handing over each element to a new task would dominate.
+    buffered_iterator = BufferedIterator([iterator], buffer_size)
+    try:
+        for element in buffered_iterator:
+            yield element
+    finally:
+        buffered_iterator.close()
+
+
+def map_ordered(function, arguments, worker_count, window_size):
+    # Yields function(argument) for each argument, in order, while worker_count threads compute
+    # the results of up to window_size arguments ahead
+    executor = ThreadPoolExecutor(max_workers=worker_count)
+    arguments = iter(arguments)
+    futures = collections.deque(executor.submit(function, argument) for argument in itertools.islice(arguments, window_size))
+    try:
+        while futures:
+            result = futures.popleft().result()
+            futures.extend(executor.submit(function, argument) for argument in itertools.islice(arguments, 1))
+            yield result
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class BufferedIterator(object):
+    # Iterates over the elements that one background thread per iterator produces into a bounded queue.
+    # With several iterators, their elements are interleaved in the order they are produced.
+
+    def __init__(self, iterators, buffer_size):
+        self.elements = queue.Queue(maxsize=buffer_size)
+        self.stopped = threading.Event()
+        self.end_of_iterator = object()
+        self.running_producers = len(iterators)
+        for iterator in iterators:
+            producer = threading.Thread(target=self.produce, args=(iterator,))
+            producer.daemon = True
+            producer.start()
+
+    def produce(self, iterator):
+        try:
+            for element in iterator:
+                if not self.put((element, None)):
+                    return
+            self.put((self.end_of_iterator, None))
+        except Exception as error:
+            self.put((self.end_of_iterator, error))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    def put(self, element):
+        while not self.stopped.is_set():
+            try:
+                self.elements.put(element, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while self.running_producers > 0:
+            element, error = self.elements.get()
+            if error is not None:
+                self.close()
+                raise error
+            if element is self.end_of_iterator:
+                self.running_producers -= 1
+                continue
+            return element
+        raise StopIteration
+
+    def close(self):
+        self.stopped.set()
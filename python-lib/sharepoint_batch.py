@@ -0,0 +1,75 @@
+import re
+import json
+
+from dss_constants import DSSConstants
+
+
+def build_batch_body(batch_boundary, changeset_boundary, operations):
+    # operations are (method, url, headers, body) tuples, all sent in a single changeset
+    lines = [
+        "--{}".format(batch_boundary),
+        "Content-Type: multipart/mixed; boundary=\"{}\"".format(changeset_boundary),
+        "Content-Transfer-Encoding: binary",
+        ""
+    ]
+    for method, url, headers, body in operations:
+        lines.extend([
+            "--{}".format(changeset_boundary),
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            "{} {} HTTP/1.1".format(method, url),
+            "Content-Type: {}".format(DSSConstants.APPLICATION_JSON),
+            "Accept: {}".format(DSSConstants.APPLICATION_JSON)
+        ])
+        for header in (headers or {}):
+            lines.append("{}: {}".format(header, headers[header]))
+        lines.append("")
+        lines.append(json.dumps(body) if body is not None else "")
+    lines.append("--{}--".format(changeset_boundary))
+    lines.append("--{}--".format(batch_boundary))
+    lines.append("")
+    return "\r\n".join(lines)
+
+
+def parse_batch_response(response_text):
+    # Returns the (status_code, body) of each operation, in the order they were sent
+    results = []
+    status_code = None
+    body_lines = None
+    for line in response_text.splitlines():
+        status_line = re.match(r"^HTTP/1\.1 (\d{3})", line)
+        if status_line:
+            if status_code is not None:
+                results.append((status_code, "\n".join(body_lines or []).strip()))
+            status_code = int(status_line.group(1))
+            body_lines = None
+        elif status_code is not None:
+            if line.startswith("--"):
+                results.append((status_code, "\n".join(body_lines or []).strip()))
+                status_code = None
+            elif body_lines is None:
+                if line.strip() == "":
+                    body_lines = []
+            else:
+                body_lines.append(line)
+    if status_code is not None:
+        results.append((status_code, "\n".join(body_lines or []).strip()))
+    return results
+
+
+def get_operation_results(results, operation_count):
+    # A changeset failing as a whole is answered with a single error, which then stands for each of its operations
+    if len(results) == 1 and operation_count > 1 and results[0][0] >= 400:
+        return results * operation_count
+    if len(results) != operation_count:
+        raise Exception("Batch response contains {} results for {} operations".format(len(results), operation_count))
+    return results
+
+
+def get_batch_error(body):
+    try:
+        json_body = json.loads(body)
+        return json_body["error"]["message"]["value"]
+    except (ValueError, KeyError, TypeError):
+        return body
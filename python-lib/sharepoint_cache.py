@@ -0,0 +1,115 @@
+import time
+import threading
+
+from collections import OrderedDict
+
+from sharepoint_constants import SharePointConstants
+
+
+class MetadataCache(object):
+    # LRU cache of folder listings, keyed by (children type, server relative folder path).
+    # Entries expire after ttl seconds, a ttl or max_size of 0 disables the cache.
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if expiry < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_tree(self, path):
+        sub_path_prefix = path.rstrip("/") + "/"
+        with self.lock:
+            for key in list(self.entries):
+                if key[1] == path or key[1].startswith(sub_path_prefix):
+                    del self.entries[key]
+
+
+class FormDigestCache(object):
+    # Form digests shared by all the sessions of the process, keyed by (origin, site, user name).
+    # A digest is handed out until refresh_margin seconds before it expires. Digests are fetched
+    # under a lock per key, so a slow host only holds up the requests waiting for its own digest.
+
+    def __init__(self, refresh_margin):
+        self.refresh_margin = refresh_margin
+        self.digests = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, fetch_digest):
+        digest = self.get_valid_digest(key)
+        if digest is not None:
+            return digest
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have fetched the digest while this one was waiting
+            digest = self.get_valid_digest(key)
+            if digest is not None:
+                return digest
+            form_digest_value, timeout_seconds = fetch_digest()
+            if form_digest_value is None:
+                return None
+            with self.lock:
+                self.digests[key] = (time.time() + max(0, timeout_seconds - self.refresh_margin), form_digest_value)
+            return form_digest_value
+
+    def get_valid_digest(self, key):
+        with self.lock:
+            digest = self.digests.get(key)
+            if digest is None or digest[0] < time.time():
+                return None
+            return digest[1]
+
+    def invalidate(self, key):
+        with self.lock:
+            self.digests.pop(key, None)
+
+
+class ListSchemaCache(object):
+    # List fields shared by all the clients of the process, keyed by (origin, site, lower cased list title).
+    # Each entry is kept with the list ETag it was read under, so it can be revalidated with If-None-Match.
+
+    def __init__(self):
+        self.schemas = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.schemas.get(key)
+
+    def set(self, key, etag, fields):
+        with self.lock:
+            self.schemas[key] = (etag, fields)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.schemas.pop(key, None)
+
+
+list_schema_cache = ListSchemaCache()
+form_digest_cache = FormDigestCache(SharePointConstants.FORM_DIGEST_REFRESH_MARGIN)
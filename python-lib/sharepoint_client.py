@@ -1,12 +1,26 @@
 import os
+import time
+import uuid
+import logging
 import requests
 import urllib.parse
 
+from requests.adapters import HTTPAdapter
 from requests_ntlm import HttpNtlmAuth
 
 from sharepoint_constants import SharePointConstants
 from dss_constants import DSSConstants
-from common import get_from_json_path
+from common import get_from_json_path, get_int_parameter, read_chunk, get_lnt_path
+from common import get_results, get_next_page_url, get_entity
+from sharepoint_batch import build_batch_body, parse_batch_response, get_operation_results
+from sharepoint_cache import MetadataCache, form_digest_cache, list_schema_cache
+from sharepoint_streaming import StreamedPage
+from sharepoint_paging import ListPager, PageSizeTuner
+from sharepoint_throttling import AdaptiveConcurrencyLimiter, get_retry_after, get_backoff_delay
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='sharepoint plugin %(levelname)s - %(message)s')
 
 
 class SharePointClient():
@@ -25,17 +39,31 @@ class SharePointClient():
             self.ignore_ssl_check = login_details['ignore_ssl_check']
         else:
             self.ignore_ssl_check = False
+        self.compact_payload = login_details.get('compact_payload', False) is True
         self.sharepoint_tenant = login_details['sharepoint_host']
         self.sharepoint_origin = login_details['sharepoint_host']
+        self.pool_size = get_int_parameter(login_details, 'pool_size', SharePointConstants.DEFAULT_POOL_SIZE)
         self.session = LocalSharePointSession(
             username,
             password,
             self.sharepoint_origin,
             self.sharepoint_site,
             sharepoint_access_token=None,
-            ignore_ssl_check=self.ignore_ssl_check
+            ignore_ssl_check=self.ignore_ssl_check,
+            pool_size=self.pool_size,
+            connect_timeout=get_int_parameter(login_details, 'connect_timeout', SharePointConstants.DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=get_int_parameter(login_details, 'read_timeout', SharePointConstants.DEFAULT_READ_TIMEOUT),
+            compact_payload=self.compact_payload,
+            max_retries=get_int_parameter(login_details, 'max_retries', SharePointConstants.DEFAULT_MAX_RETRIES)
         )
         self.sharepoint_list_title = config.get("sharepoint_list_title")
+        self.page_size = min(get_int_parameter(config, "page_size", 0), SharePointConstants.MAX_PAGE_SIZE)
+        self.keyset_pagination = config.get("pagination") == SharePointConstants.PAGINATION_KEYSET
+        self.auto_page_size = config.get("auto_page_size", False) is True
+        self.metadata_cache = MetadataCache(
+            get_int_parameter(config, "metadata_cache_ttl", SharePointConstants.DEFAULT_METADATA_CACHE_TTL),
+            get_int_parameter(config, "metadata_cache_size", SharePointConstants.DEFAULT_METADATA_CACHE_SIZE)
+        )
 
     def setup_login_details(self, login_details):
         self.sharepoint_site = login_details['sharepoint_site']
@@ -44,15 +72,49 @@ class SharePointClient():
         else:
             self.sharepoint_root = "Shared Documents"
 
+    def close(self):
+        self.session.close()
+
     def get_folders(self, path):
-        response = self.session.get(self.get_sharepoint_item_url(path) + "/Folders")
-        self.assert_response_ok(response)
-        return response.json()
+        return self.get_folder_children(path, SharePointConstants.FOLDERS)
 
     def get_files(self, path):
-        response = self.session.get(self.get_sharepoint_item_url(path) + "/Files")
+        return self.get_folder_children(path, SharePointConstants.FILES)
+
+    def get_folder_children(self, path, children_type):
+        cache_key = (children_type, get_lnt_path(path))
+        children = self.metadata_cache.get(cache_key)
+        if children is None:
+            response = self.session.get(
+                self.get_sharepoint_item_url(path) + "/" + children_type,
+                params=self.get_select_params(
+                    SharePointConstants.FILES_SELECT if children_type == SharePointConstants.FILES else SharePointConstants.FOLDERS_SELECT
+                )
+            )
+            self.assert_response_ok(response)
+            children = response.json()
+            self.metadata_cache.set(cache_key, children)
+        return children
+
+    def invalidate_parent_listing(self, full_path, children_type):
+        parent_path, item_name = os.path.split(get_lnt_path(full_path))
+        self.metadata_cache.invalidate((children_type, parent_path))
+
+    def get_file_properties(self, full_path):
+        return self.get_item_properties(self.get_file_url(full_path), SharePointConstants.FILE_PROPERTIES)
+
+    def get_folder_properties(self, full_path):
+        return self.get_item_properties(self.get_folder_url(full_path.rstrip("/")), SharePointConstants.FOLDER_PROPERTIES)
+
+    def get_item_properties(self, url, properties):
+        response = self.session.get(url, params={"$select": ",".join(properties)})
+        if response.status_code == 404:
+            return None
         self.assert_response_ok(response)
-        return response.json()
+        item = get_entity(response.json())
+        if item.get(SharePointConstants.EXISTS) is False:
+            return None
+        return item
 
     def get_sharepoint_item_url(self, path):
         if path == '/':
@@ -64,9 +126,10 @@ class SharePointClient():
             path
         )
 
-    def get_file_content(self, full_path):
+    def get_file_content(self, full_path, stream=False):
         response = self.session.get(
-            self.get_file_content_url(full_path)
+            self.get_file_content_url(full_path),
+            stream=stream
         )
         self.assert_response_ok(response, no_json=True)
         return response
@@ -84,13 +147,117 @@ class SharePointClient():
             headers=headers,
             data=data
         )
+        self.invalidate_parent_listing(full_path, SharePointConstants.FILES)
         self.assert_response_ok(response)
         return response
 
+    def write_file_content_chunked(self, full_path, stream, chunk_size):
+        chunk = read_chunk(stream, chunk_size)
+        next_chunk = read_chunk(stream, chunk_size)
+        if len(next_chunk) == 0:
+            return self.write_file_content(full_path, chunk)
+
+        # The chunks go to a temporary file, moved over the target once complete,
+        # so that a failed upload leaves the existing file untouched
+        upload_id = str(uuid.uuid4())
+        full_path_parent, file_name = os.path.split(full_path)
+        upload_path = os.path.join(full_path_parent, "{}.{}.upload".format(file_name, upload_id))
+        # The upload session needs an existing file to attach to
+        self.write_file_content(upload_path, b"")
+        try:
+            file_offset = self.upload_chunk(upload_path, upload_id, 0, chunk)
+            chunk = next_chunk
+            next_chunk = read_chunk(stream, chunk_size)
+            while len(next_chunk) > 0:
+                file_offset = self.upload_chunk(upload_path, upload_id, file_offset, chunk)
+                chunk = next_chunk
+                next_chunk = read_chunk(stream, chunk_size)
+            self.upload_chunk(upload_path, upload_id, file_offset, chunk, is_last_chunk=True)
+        except Exception:
+            self.discard_upload(upload_path, upload_id)
+            raise
+        try:
+            return self.move_file(upload_path, full_path)
+        except Exception:
+            self.discard_upload(upload_path)
+            raise
+
+    def upload_chunk(self, full_path, upload_id, file_offset, data, is_last_chunk=False):
+        # Returns the offset the server is at once the chunk is received. A chunk whose outcome is unknown
+        # is not sent again blindly: the server is first asked whether it received it.
+        attempt = 0
+        while True:
+            if is_last_chunk:
+                url = self.get_finish_upload_url(full_path, upload_id, file_offset)
+            elif file_offset == 0:
+                url = self.get_start_upload_url(full_path, upload_id)
+            else:
+                url = self.get_continue_upload_url(full_path, upload_id, file_offset)
+            headers = {
+                "Content-Length": "{}".format(len(data))
+            }
+            try:
+                response = self.session.post(url, headers=headers, data=data)
+                if response.status_code < 500:
+                    self.assert_response_ok(response)
+                    if is_last_chunk:
+                        return file_offset + len(data)
+                    return self.get_upload_offset(response)
+                error = "status {}".format(response.status_code)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as request_error:
+                error = request_error
+            if attempt >= self.session.max_retries:
+                raise Exception("Chunk at offset {} of {} could not be uploaded: {}".format(file_offset, full_path, error))
+            attempt += 1
+            delay = get_backoff_delay(attempt)
+            logger.warning("upload_chunk:chunk at offset {} failed ({}), checking it in {:.1f}s".format(file_offset, error, delay))
+            time.sleep(delay)
+            server_offset = self.get_received_offset(full_path, upload_id, file_offset + len(data), is_last_chunk)
+            if server_offset is not None:
+                return server_offset
+
+    def get_received_offset(self, full_path, upload_id, expected_offset, is_last_chunk):
+        # Returns the server's offset if the chunk ending at expected_offset was received, None otherwise
+        if is_last_chunk:
+            # Once finished the upload session is gone, but the file has its full size
+            try:
+                properties = self.get_file_properties(full_path)
+            except Exception:
+                return None
+            if properties is not None and int(properties.get(SharePointConstants.LENGTH) or 0) == expected_offset:
+                return expected_offset
+            return None
+        # An empty chunk is only accepted at the offset the server is at
+        response = self.session.post(
+            self.get_continue_upload_url(full_path, upload_id, expected_offset),
+            headers={"Content-Length": "0"},
+            data=b""
+        )
+        if response.status_code >= 400:
+            return None
+        return self.get_upload_offset(response)
+
+    def get_upload_offset(self, response):
+        # StartUpload and ContinueUpload answer with the number of bytes received so far
+        upload_status = get_entity(response.json())
+        if isinstance(upload_status, dict):
+            upload_status = upload_status.get(SharePointConstants.VALUE, next(iter(upload_status.values()), None))
+        return int(upload_status)
+
+    def discard_upload(self, upload_path, upload_id=None):
+        try:
+            if upload_id is not None:
+                self.session.post(self.get_cancel_upload_url(upload_path, upload_id), is_idempotent=True)
+            self.delete_file(upload_path)
+        except Exception as error:
+            logger.warning("discard_upload:temporary file {} could not be deleted: {}".format(upload_path, error))
+
     def create_folder(self, full_path):
         response = self.session.post(
-            self.get_add_folder_url(full_path)
+            self.get_add_folder_url(full_path),
+            is_idempotent=True
         )
+        self.invalidate_parent_listing(full_path, SharePointConstants.FOLDERS)
         return response
 
     def move_file(self, full_from_path, full_to_path):
@@ -100,6 +267,8 @@ class SharePointClient():
                 full_to_path
             )
         )
+        self.invalidate_parent_listing(full_from_path, SharePointConstants.FILES)
+        self.invalidate_parent_listing(full_to_path, SharePointConstants.FILES)
         self.assert_response_ok(response)
         return response.json()
 
@@ -109,8 +278,10 @@ class SharePointClient():
         }
         response = self.session.post(
             self.get_file_url(full_path),
-            headers=headers
+            headers=headers,
+            is_idempotent=True
         )
+        self.invalidate_parent_listing(full_path, SharePointConstants.FILES)
         self.assert_response_ok(response, no_json=True)
 
     def delete_folder(self, full_path):
@@ -119,29 +290,188 @@ class SharePointClient():
         }
         self.session.post(
             self.get_folder_url(full_path),
-            headers=headers
+            headers=headers,
+            is_idempotent=True
         )
+        self.invalidate_parent_listing(full_path, SharePointConstants.FOLDERS)
+        self.metadata_cache.invalidate_tree(get_lnt_path(full_path))
+
+    def get_folder_list_id(self, full_path):
+        response = self.session.get(self.get_folder_url(full_path) + "/Properties")
+        self.assert_response_ok(response)
+        properties = get_entity(response.json())
+        list_id = properties.get(SharePointConstants.FOLDER_LIST_ID)
+        if not list_id:
+            return None
+        return list_id.strip("{}")
+
+    def get_recursive_files(self, full_path):
+        # One paged CAML query per folder tree, instead of listing every folder
+        list_id = self.get_folder_list_id(full_path)
+        if list_id is None:
+            raise Exception("The folder {} is not part of a document library".format(full_path))
+        folder_path = get_lnt_path(self.get_server_relative_path(full_path))
+        last_id = None
+        while True:
+            query = {
+                "__metadata": {"type": "SP.CamlQuery"},
+                "ViewXml": SharePointConstants.RECURSIVE_FILES_VIEW_XML.format(SharePointConstants.RECURSIVE_QUERY_PAGE_SIZE),
+                "FolderServerRelativeUrl": folder_path
+            }
+            if last_id is not None:
+                query["ListItemCollectionPosition"] = {
+                    "__metadata": {"type": "SP.ListItemCollectionPosition"},
+                    "PagingInfo": "Paged=TRUE&p_ID={}".format(last_id)
+                }
+            headers = {
+                "content-type": DSSConstants.APPLICATION_JSON
+            }
+            response = self.session.post(
+                self.get_list_get_items_url(list_id),
+                headers=headers,
+                json={"query": query},
+                is_idempotent=True
+            )
+            self.assert_response_ok(response)
+            items = get_results(response.json())
+            for item in items:
+                if "{}".format(item.get(SharePointConstants.FILE_SYSTEM_OBJECT_TYPE)) != "0":
+                    continue
+                file_path = get_lnt_path(item[SharePointConstants.FILE_REF])
+                yield {
+                    SharePointConstants.NAME: file_path[len(folder_path):].strip("/"),
+                    SharePointConstants.LENGTH: item.get(SharePointConstants.FILE_SIZE),
+                    SharePointConstants.TIME_LAST_MODIFIED: item.get(SharePointConstants.MODIFIED)
+                }
+            if len(items) < SharePointConstants.RECURSIVE_QUERY_PAGE_SIZE:
+                break
+            last_id = items[-1][SharePointConstants.ID]
 
     def get_list_fields(self, list_title):
+        cache_key = self.get_list_schema_key(list_title)
+        cached_schema = list_schema_cache.get(cache_key)
+        cached_etag = None if cached_schema is None else cached_schema[0]
+        list_etag = self.get_list_etag(list_title, cached_etag)
+        if cached_schema is not None and list_etag == cached_etag:
+            logger.info("get_list_fields:schema of list '{}' is unchanged".format(list_title))
+            return cached_schema[1]
         url = self.get_list_fields_url(list_title)
         response = self.session.get(
-            url
+            url,
+            params=self.get_select_params(SharePointConstants.FIELDS_SELECT)
         )
         self.assert_response_ok(response)
-        return response.json()
+        fields = response.json()
+        if list_etag is not None:
+            list_schema_cache.set(cache_key, list_etag, fields)
+        return fields
 
-    def get_list_all_items(self, list_title, column_to_expand=None):
-        items = self.get_list_items(list_title, column_to_expand)
-        buffer = items
-        while SharePointConstants.RESULTS_CONTAINER_V2 in items and SharePointConstants.NEXT_PAGE in items[SharePointConstants.RESULTS_CONTAINER_V2]:
-            items = self.session.get(items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.NEXT_PAGE]).json()
-            buffer[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS].extend(
-                items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]
+    def get_list_etag(self, list_title, cached_etag=None):
+        headers = {}
+        if cached_etag is not None:
+            headers["If-None-Match"] = cached_etag
+        response = self.session.get(
+            self.get_lists_by_title_url(list_title),
+            headers=headers,
+            params={"$select": SharePointConstants.ID}
+        )
+        if response.status_code == 304:
+            return cached_etag
+        self.assert_response_ok(response)
+        etag = response.headers.get("ETag")
+        if etag is None:
+            etag = get_entity(response.json()).get("__metadata", {}).get("etag")
+        return etag
+
+    def get_list_schema_key(self, list_title):
+        # GetByTitle is case insensitive, so are the keys
+        return (self.sharepoint_origin, self.sharepoint_site, list_title.lower())
+
+    def invalidate_list_schema(self, list_title):
+        list_schema_cache.invalidate(self.get_list_schema_key(list_title))
+
+    def get_list_pages(self, list_title, column_to_expand=None, filter_query=None, filter_expand=None, records_limit=None):
+        pager = self.get_list_pager(list_title, column_to_expand, filter_query, filter_expand, records_limit)
+        while pager.has_next_page():
+            start_time = time.time()
+            response = self.session.get(pager.url, params=pager.params)
+            self.assert_response_ok(response)
+            items = response.json()
+            results = get_results(items)
+            if results is None:
+                raise Exception("Error when interacting with SharePoint")
+            results = pager.truncate(results)
+            pager.update(
+                len(results),
+                results[-1] if results else None,
+                get_next_page_url(items),
+                duration=time.time() - start_time,
+                size=len(response.content)
             )
-        return buffer
+            yield results
+
+    def get_list_item_stream(self, list_title, column_to_expand=None, filter_query=None, filter_expand=None, records_limit=None):
+        # Same items as get_list_pages, decoded one at a time while each page is received
+        pager = self.get_list_pager(list_title, column_to_expand, filter_query, filter_expand, records_limit)
+        while pager.has_next_page():
+            start_time = time.time()
+            response = self.session.get(pager.url, params=pager.params, stream=True)
+            item_count = 0
+            item = None
+            try:
+                if response.status_code >= 400:
+                    self.assert_response_ok(response)
+                    raise Exception("Error {} when interacting with SharePoint".format(response.status_code))
+                page = StreamedPage(response)
+                for item in page.items():
+                    yield item
+                    item_count += 1
+                    if pager.records_left is not None and item_count >= pager.records_left:
+                        return
+            finally:
+                response.close()
+            pager.update(item_count, item, page.next_page_url, duration=time.time() - start_time)
+
+    def get_list_pager(self, list_title, column_to_expand=None, filter_query=None, filter_expand=None, records_limit=None):
+        if self.keyset_pagination and column_to_expand:
+            # Keyset paging resumes from the last ID received, which must then be selected
+            column_to_expand = dict(column_to_expand, **{SharePointConstants.ID: None})
+
+        def get_params(page_filter_query, top):
+            params = self.get_list_items_params(column_to_expand, page_filter_query, filter_expand, top)
+            return {} if params is None else params
+
+        return ListPager(
+            self.get_list_items_url(list_title),
+            get_params,
+            filter_query=filter_query,
+            records_limit=records_limit,
+            page_size=self.page_size,
+            keyset=self.keyset_pagination,
+            tuner=PageSizeTuner(self.page_size) if self.auto_page_size and self.keyset_pagination else None
+        )
 
-    def get_list_items(self, list_title, columns_to_expand=None):
-        if columns_to_expand is not None:
+    def get_list_id_range(self, list_title, filter_query=None, filter_expand=None):
+        # Lowest and highest item IDs, ID being indexed these stay cheap on lists above the view threshold
+        item_ids = []
+        for order in ["asc", "desc"]:
+            params = {
+                "$select": SharePointConstants.ID,
+                "$orderby": "{} {}".format(SharePointConstants.ID, order)
+            }
+            response = self.session.get(
+                self.get_list_items_url(list_title),
+                params=self.add_query_params(params, filter_query, filter_expand, top=1)
+            )
+            self.assert_response_ok(response)
+            results = get_results(response.json())
+            if not results:
+                return None
+            item_ids.append(results[0].get(SharePointConstants.ID))
+        return item_ids[0], item_ids[1]
+
+    def get_list_items_params(self, columns_to_expand=None, filter_query=None, filter_expand=None, top=None):
+        if columns_to_expand:
             select = []
             expand = []
             for column_to_expand in columns_to_expand:
@@ -151,17 +481,123 @@ class SharePointClient():
                     select.append("{}/{}".format(column_to_expand, columns_to_expand.get(column_to_expand)))
                     expand.append(column_to_expand)
             params = {
-                "$select": ",".join(select),
-                "$expand": ",".join(expand)
+                "$select": ",".join(select)
             }
+            if expand:
+                params["$expand"] = ",".join(expand)
         else:
             params = None
+        return self.add_query_params(params, filter_query, filter_expand, top)
+
+    def add_query_params(self, params, filter_query=None, filter_expand=None, top=None):
+        if filter_query is None and top is None:
+            return params
+        params = {} if params is None else params
+        if filter_query is not None:
+            params["$filter"] = filter_query
+        if filter_expand:
+            # Filtering on a lookup's projected field requires the lookup to be expanded
+            expand = [column for column in params.get("$expand", "").split(",") if column]
+            if filter_expand not in expand:
+                expand.append(filter_expand)
+            params["$expand"] = ",".join(expand)
+        if top is not None:
+            params["$top"] = top
+        return params
+
+    def has_list_items(self, list_title, filter_query=None, filter_expand=None):
+        params = self.add_query_params({"$select": SharePointConstants.ID}, filter_query, filter_expand, top=1)
         response = self.session.get(
             self.get_list_items_url(list_title),
             params=params
         )
         self.assert_response_ok(response)
-        return response.json()
+        return len(get_results(response.json()) or []) > 0
+
+    def get_list_items_by_ids(self, list_title, item_ids, column_to_expand=None):
+        for chunk_start in range(0, len(item_ids), SharePointConstants.ITEMS_PER_ID_FILTER):
+            chunk_ids = item_ids[chunk_start:chunk_start + SharePointConstants.ITEMS_PER_ID_FILTER]
+            filter_query = " or ".join(["ID eq {}".format(item_id) for item_id in chunk_ids])
+            for page in self.get_list_pages(list_title, column_to_expand, filter_query=filter_query):
+                for item in page:
+                    yield item
+
+    def get_list_item_count(self, list_title):
+        response = self.session.get(
+            self.get_lists_by_title_url(list_title),
+            params={"$select": SharePointConstants.ITEM_COUNT}
+        )
+        self.assert_response_ok(response)
+        return get_entity(response.json()).get(SharePointConstants.ITEM_COUNT)
+
+    def count_list_items(self, list_title, filter_query=None, filter_expand=None):
+        count = 0
+        pages = self.get_list_pages(
+            list_title,
+            column_to_expand={SharePointConstants.ID: None},
+            filter_query=filter_query,
+            filter_expand=filter_expand
+        )
+        for page in pages:
+            count += len(page)
+        return count
+
+    def get_list_change_token(self, list_title):
+        response = self.session.get(
+            self.get_lists_by_title_url(list_title),
+            params={"$select": SharePointConstants.CURRENT_CHANGE_TOKEN}
+        )
+        self.assert_response_ok(response)
+        change_token = get_entity(response.json()).get(SharePointConstants.CURRENT_CHANGE_TOKEN, {})
+        return change_token.get(SharePointConstants.STRING_VALUE)
+
+    def get_list_changes(self, list_title, change_token):
+        # GetChanges returns a limited number of changes per call, the last one giving the token to resume from
+        headers = {
+            "content-type": DSSConstants.APPLICATION_JSON
+        }
+        while True:
+            body = {
+                "query": {
+                    "__metadata": {"type": "SP.ChangeQuery"},
+                    "Item": True,
+                    "Add": True,
+                    "Update": True,
+                    "DeleteObject": True,
+                    "Rename": True,
+                    "Restore": True,
+                    "Move": True,
+                    "SystemUpdate": True,
+                    "ChangeTokenStart": {
+                        "__metadata": {"type": "SP.ChangeToken"},
+                        "StringValue": change_token
+                    }
+                }
+            }
+            response = self.session.post(
+                self.get_lists_by_title_url(list_title) + "/GetChanges",
+                headers=headers,
+                json=body,
+                is_idempotent=True
+            )
+            self.assert_response_ok(response)
+            changes = get_results(response.json()) or []
+            for change in changes:
+                yield change
+            if len(changes) == 0:
+                break
+            next_change_token = changes[-1].get(SharePointConstants.CHANGE_TOKEN, {}).get(SharePointConstants.STRING_VALUE)
+            if next_change_token is None or next_change_token == change_token:
+                break
+            change_token = next_change_token
+
+    def get_select_params(self, columns):
+        # Projections are only sent in compact mode, verbose mode keeps the full payloads
+        if not self.compact_payload:
+            return None
+        return {
+            "$select": ",".join(columns)
+        }
 
     def create_list(self, list_name):
         headers = {
@@ -182,6 +618,7 @@ class SharePointClient():
             headers=headers,
             json=data
         )
+        self.invalidate_list_schema(list_name)
         self.assert_response_ok(response)
         return response
 
@@ -192,28 +629,46 @@ class SharePointClient():
         }
         response = self.session.post(
             self.get_lists_by_title_url(list_name),
-            headers=headers
+            headers=headers,
+            is_idempotent=True
         )
+        self.invalidate_list_schema(list_name)
         return response
 
-    def create_custom_field(self, list_title, field_title, field_type=None):
+    def create_custom_fields(self, list_title, fields):
+        # fields are (title, type) tuples, returns the (status_code, body) of each creation
+        results = []
+        for batch_start in range(0, len(fields), SharePointConstants.DEFAULT_BATCH_SIZE):
+            operations = []
+            for field_title, field_type in fields[batch_start:batch_start + SharePointConstants.DEFAULT_BATCH_SIZE]:
+                operations.append((
+                    "POST",
+                    self.get_lists_add_field_url(list_title),
+                    None,
+                    self.get_custom_field_body(field_title, field_type)
+                ))
+            results.extend(self.post_batch(operations))
+        self.invalidate_list_schema(list_title)
+        return results
+
+    def get_custom_field_body(self, field_title, field_type=None):
         field_type = SharePointConstants.FALLBACK_TYPE if field_type is None else field_type
-        body = {
+        return {
             'parameters': {
                 '__metadata': {'type': 'SP.XmlSchemaFieldCreationInformation'},
                 'SchemaXml': "<Field DisplayName='{0}' Format='Dropdown' MaxLength='255' Type='{1}'></Field>".format(self.amp_escape(field_title), field_type)
             }
         }
-        headers = {
-            "content-type": DSSConstants.APPLICATION_JSON
-        }
-        response = self.session.post(
-            self.get_lists_add_field_url(list_title),
-            headers=headers,
-            json=body
+
+    def list_exists(self, list_title):
+        response = self.session.get(
+            self.get_lists_by_title_url(list_title),
+            params={"$select": SharePointConstants.ID}
         )
+        if response.status_code == 404:
+            return False
         self.assert_response_ok(response)
-        return response
+        return True
 
     def amp_escape(self, to_format):
         to_convert = {'"': '&quot;', "'": "&apos;", "<": "&lt;", ">": "&gt;", "&": "&amp;", "/": "&#x2F;"}
@@ -221,43 +676,97 @@ class SharePointClient():
             to_format = to_format.replace(key, to_convert[key])
         return to_format
 
-    def add_list_item(self, list_title, item):
+    def get_add_item_operation(self, list_title, entity_type, item):
+        item["__metadata"] = {
+            "type": entity_type
+        }
+        return ("POST", self.get_list_items_url(list_title), None, item)
+
+    def get_update_item_operation(self, list_title, entity_type, item_id, item):
         item["__metadata"] = {
-            "type": "SP.Data.{}ListItem".format(list_title.capitalize().replace(" ", "_x0020_"))
+            "type": entity_type
+        }
+        headers = {
+            "X-HTTP-Method": "MERGE",
+            "IF-MATCH": "*"
         }
+        return ("POST", self.get_list_item_url(list_title, item_id), headers, item)
+
+    def get_delete_item_operation(self, list_title, item_id):
         headers = {
-            "Content-Type": DSSConstants.APPLICATION_JSON
+            "X-HTTP-Method": "DELETE",
+            "IF-MATCH": "*"
         }
+        return ("POST", self.get_list_item_url(list_title, item_id), headers, None)
+
+    def send_operation(self, operation):
+        # Sends on its own an operation built for a batch
+        method, url, headers, body = operation
+        headers = dict(headers or {}, **{"Content-Type": DSSConstants.APPLICATION_JSON})
         response = self.session.post(
-            self.get_list_items_url(list_title),
-            json=item,
-            headers=headers
+            url,
+            headers=headers,
+            json=body
         )
-        self.assert_response_ok(response)
+        self.assert_response_ok(response, no_json=True)
         return response
 
+    def post_batch(self, operations):
+        batch_boundary = "batch_{}".format(uuid.uuid4())
+        changeset_boundary = "changeset_{}".format(uuid.uuid4())
+        headers = {
+            "Content-Type": "multipart/mixed; boundary={}".format(batch_boundary)
+        }
+        response = self.session.post(
+            self.get_batch_url(),
+            headers=headers,
+            data=build_batch_body(batch_boundary, changeset_boundary, operations).encode("utf-8")
+        )
+        self.assert_response_ok(response, no_json=True)
+        return get_operation_results(parse_batch_response(response.text), len(operations))
+
+    def get_list_item_entity_type(self, list_title):
+        # Derived by SharePoint from the list's URL name, which may differ from its title
+        response = self.session.get(
+            self.get_lists_by_title_url(list_title),
+            params={"$select": SharePointConstants.LIST_ITEM_ENTITY_TYPE}
+        )
+        self.assert_response_ok(response)
+        return get_entity(response.json()).get(SharePointConstants.LIST_ITEM_ENTITY_TYPE)
+
     def get_base_url(self):
         return "{}/{}/_api/Web".format(
             self.sharepoint_origin, self.sharepoint_site
         )
 
+    def get_batch_url(self):
+        return "{}/{}/_api/$batch".format(
+            self.sharepoint_origin, self.sharepoint_site
+        )
+
     def get_lists_url(self):
         return self.get_base_url() + "/lists"
 
     def get_lists_by_title_url(self, list_title):
         return self.get_lists_url() + "/GetByTitle('{}')".format(urllib.parse.quote(list_title))
 
+    def get_list_get_items_url(self, list_id):
+        return self.get_lists_url() + "(guid'{}')/GetItems?$select={}".format(
+            list_id,
+            ",".join(SharePointConstants.RECURSIVE_FILES_FIELDS)
+        )
+
     def get_list_items_url(self, list_title):
         return self.get_lists_by_title_url(list_title) + "/Items"
 
+    def get_list_item_url(self, list_title, item_id):
+        return self.get_list_items_url(list_title) + "({})".format(item_id)
+
     def get_list_fields_url(self, list_title):
         return self.get_lists_by_title_url(list_title) + "/fields"
 
     def get_lists_add_field_url(self, list_title):
-        return self.get_base_url() + "/GetList(@a1)/Fields/CreateFieldAsXml?@a1='/{}/Lists/{}'".format(
-            self.sharepoint_site,
-            list_title
-        )
+        return self.get_lists_by_title_url(list_title) + "/Fields/CreateFieldAsXml"
 
     def get_folder_url(self, full_path):
         return self.get_base_url() + "/GetFolderByServerRelativeUrl({})".format(
@@ -278,7 +787,10 @@ class SharePointClient():
         )
 
     def get_site_path(self, full_path):
-        return "'/{}/{}{}'".format(self.sharepoint_site, self.sharepoint_root, full_path)
+        return "'{}'".format(self.get_server_relative_path(full_path))
+
+    def get_server_relative_path(self, full_path):
+        return "/{}/{}{}".format(self.sharepoint_site, self.sharepoint_root, full_path)
 
     def get_add_folder_url(self, full_path):
         return self.get_base_url() + "/Folders/add('{}/{}')".format(
@@ -289,6 +801,18 @@ class SharePointClient():
     def get_file_add_url(self, full_path, file_name):
         return self.get_folder_url(full_path) + "/Files/add(url='{}',overwrite=true)".format(file_name)
 
+    def get_start_upload_url(self, full_path, upload_id):
+        return self.get_file_url(full_path) + "/StartUpload(uploadId=guid'{}')".format(upload_id)
+
+    def get_continue_upload_url(self, full_path, upload_id, file_offset):
+        return self.get_file_url(full_path) + "/ContinueUpload(uploadId=guid'{}',fileOffset={})".format(upload_id, file_offset)
+
+    def get_finish_upload_url(self, full_path, upload_id, file_offset):
+        return self.get_file_url(full_path) + "/FinishUpload(uploadId=guid'{}',fileOffset={})".format(upload_id, file_offset)
+
+    def get_cancel_upload_url(self, full_path, upload_id):
+        return self.get_file_url(full_path) + "/CancelUpload(uploadId=guid'{}')".format(upload_id)
+
     def assert_login_details(self, required_keys, login_details):
         if login_details is None or login_details == {}:
             raise Exception("Login details are empty")
@@ -308,9 +832,10 @@ class SharePointClient():
             if len(response.content) == 0:
                 raise Exception("Empty response from SharePoint. Please check user credentials.")
             json_response = response.json()
-            if "error" in json_response:
-                if "message" in json_response["error"] and "value" in json_response["error"]["message"]:
-                    raise Exception("Error: {}".format(json_response["error"]["message"]["value"]))
+            error = json_response.get("error", json_response.get("odata.error"))
+            if error is not None:
+                if "message" in error and "value" in error["message"]:
+                    raise Exception("Error: {}".format(error["message"]["value"]))
                 else:
                     raise Exception("Error")
 
@@ -340,8 +865,10 @@ class SharePointSession():
 
 class LocalSharePointSession():
 
-    def __init__(self, sharepoint_user_name, sharepoint_password, sharepoint_origin, sharepoint_site, sharepoint_access_token=None, ignore_ssl_check=False):
-        self.form_digest_value = None
+    def __init__(self, sharepoint_user_name, sharepoint_password, sharepoint_origin, sharepoint_site, sharepoint_access_token=None, ignore_ssl_check=False,
+                 pool_size=SharePointConstants.DEFAULT_POOL_SIZE, connect_timeout=SharePointConstants.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=SharePointConstants.DEFAULT_READ_TIMEOUT, compact_payload=False,
+                 max_retries=SharePointConstants.DEFAULT_MAX_RETRIES):
         self.sharepoint_origin = sharepoint_origin
         self.sharepoint_site = sharepoint_site
         self.ignore_ssl_check = ignore_ssl_check
@@ -349,21 +876,34 @@ class LocalSharePointSession():
         self.sharepoint_user_name = sharepoint_user_name
         self.sharepoint_password = sharepoint_password
         self.auth = HttpNtlmAuth(sharepoint_user_name, sharepoint_password)
+        self.form_digest_key = (sharepoint_origin, sharepoint_site, sharepoint_user_name)
+        self.timeout = (connect_timeout, read_timeout)
+        self.accept = DSSConstants.APPLICATION_JSON_NOMETADATA if compact_payload else DSSConstants.APPLICATION_JSON
+        # NTLM authenticates the TCP connection rather than each request, so keeping
+        # connections alive in a pool means the handshake is only done once per connection
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.ignore_ssl_check is True:
+            self.session.verify = False
+        self.max_retries = max_retries
+        self.limiter = AdaptiveConcurrencyLimiter(pool_size)
 
-    def get(self, url, headers=None, params=None):
+    def get(self, url, headers=None, params=None, stream=False):
         headers = {} if headers is None else headers
-        headers["accept"] = DSSConstants.APPLICATION_JSON
+        headers["accept"] = self.accept
         args = {
             "headers": headers,
-            "auth": self.auth
+            "timeout": self.timeout,
+            "stream": stream
         }
         if params is not None:
             args.update({"params": params})
-        if self.ignore_ssl_check is True:
-            args["verify"] = False
-        return requests.get(url, **args)
+        return self.send("GET", url, True, **args)
 
-    def post(self, url, headers=None, json=None, data=None):
+    def post(self, url, headers=None, json=None, data=None, is_idempotent=False):
         headers = {} if headers is None else headers
         headers["accept"] = DSSConstants.APPLICATION_JSON
         form_digest_value = self.get_form_digest_value()
@@ -373,40 +913,84 @@ class LocalSharePointSession():
             "headers": headers,
             "json": json,
             "data": data,
-            "auth": self.auth
+            "timeout": self.timeout
         }
-        if self.ignore_ssl_check is True:
-            args["verify"] = False
-        return requests.post(url, **args)
+        response = self.send("POST", url, is_idempotent, **args)
+        if form_digest_value is not None and self.is_form_digest_expired(response):
+            # The request was rejected before being processed, so it can be sent again with a new digest
+            logger.info("post:form digest expired, refreshing it")
+            form_digest_cache.invalidate(self.form_digest_key)
+            headers["X-RequestDigest"] = self.get_form_digest_value()
+            response = self.send("POST", url, is_idempotent, **args)
+        return response
+
+    def send(self, method, url, is_idempotent, **args):
+        # Throttled requests were rejected before being processed, so they are always retried.
+        # Server errors and connection failures are only retried for idempotent requests.
+        attempt = 0
+        while True:
+            is_throttled = False
+            is_failed = True
+            self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, **args)
+                is_throttled = response.status_code in SharePointConstants.THROTTLING_STATUS_CODES
+                is_failed = response.status_code >= 500
+                error = "status {}".format(response.status_code)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as request_error:
+                if not is_idempotent or attempt >= self.max_retries:
+                    raise
+                response = None
+                error = request_error
+            finally:
+                self.limiter.release(is_throttled, is_failed)
+            if response is not None:
+                is_retryable = is_throttled or (is_idempotent and response.status_code in SharePointConstants.TRANSIENT_STATUS_CODES)
+                if not is_retryable or attempt >= self.max_retries:
+                    return response
+            delay = None
+            if response is not None:
+                delay = get_retry_after(response)
+                response.close()
+            if delay is None:
+                delay = get_backoff_delay(attempt)
+            attempt += 1
+            logger.warning("{} {} failed ({}), retry {}/{} in {:.1f}s".format(method, url, error, attempt, self.max_retries, delay))
+            time.sleep(delay)
 
     def get_form_digest_value(self):
-        if self.form_digest_value is not None:
-            return self.form_digest_value
+        return form_digest_cache.get(self.form_digest_key, self.fetch_form_digest)
+
+    def fetch_form_digest(self):
         headers = {}
         headers["accept"] = DSSConstants.APPLICATION_JSON
         args = {
             "headers": headers,
-            "auth": self.auth
+            "timeout": self.timeout
         }
-        if self.ignore_ssl_check is True:
-            args["verify"] = False
-        response = requests.post(self.get_context_info_url(), **args)
-        print("get_form_digest_value:status={}:content={}".format(response.status_code, response.content))
+        response = self.send("POST", self.get_context_info_url(), True, **args)
+        logger.info("fetch_form_digest:status={}".format(response.status_code))
         self.assert_response_ok(response)
         try:
-            json_response = response.json()
-            return get_from_json_path(["d", "GetContextWebInformation", "FormDigestValue"], json_response)
+            context_info = get_from_json_path(["d", "GetContextWebInformation"], response.json())
         except ValueError:
-            return None
-        except KeyError:
-            return None
-        return None
+            return None, None
+        if context_info is None:
+            return None, None
+        timeout_seconds = context_info.get(SharePointConstants.FORM_DIGEST_TIMEOUT) or SharePointConstants.DEFAULT_FORM_DIGEST_TIMEOUT
+        return context_info.get(SharePointConstants.FORM_DIGEST_VALUE), int(timeout_seconds)
+
+    def is_form_digest_expired(self, response):
+        return response.status_code == 403 and SharePointConstants.FORM_DIGEST_EXPIRED_ERROR_CODE in response.text
 
     def get_context_info_url(self):
         return "{}/{}/_api/contextinfo".format(
             self.sharepoint_origin, self.sharepoint_site
         )
 
+    def close(self):
+        self.session.close()
+
     def assert_response_ok(self, response):
         if response.status_code >= 400:
             raise Exception("Error {} : {}".format(
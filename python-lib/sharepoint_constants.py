@@ -17,10 +17,29 @@ class SharePointConstants(object):
     VALUE = 'value'
     TIME_LAST_MODIFIED = 'TimeLastModified'
     NEXT_PAGE = '__next'
+    NEXT_LINK = 'odata.nextLink'
     LENGTH = 'Length'
     NAME = 'Name'
+    EXISTS = 'Exists'
     MOVE_TO = "MoveTo"
+    FILES = "Files"
+    FOLDERS = "Folders"
+    ID = "ID"
+    FILE_REF = "FileRef"
+    FILE_SIZE = "File_x0020_Size"
+    MODIFIED = "Modified"
+    FILE_SYSTEM_OBJECT_TYPE = "FSObjType"
+    FOLDER_LIST_ID = "vti_x005f_listname"
+    CURRENT_CHANGE_TOKEN = "CurrentChangeToken"
+    CHANGE_TOKEN = "ChangeToken"
+    CHANGE_TYPE = "ChangeType"
+    ITEM_ID = "ItemId"
+    ITEM_COUNT = "ItemCount"
+    LIST_ITEM_ENTITY_TYPE = "ListItemEntityTypeFullName"
+    STRING_VALUE = "StringValue"
     FORM_DIGEST_VALUE = "FormDigestValue"
+    FORM_DIGEST_TIMEOUT = "FormDigestTimeoutSeconds"
+    FORM_DIGEST_EXPIRED_ERROR_CODE = "-2130575251"
     TYPES = {
         "Text": "string",
         "Number": "string",
@@ -33,4 +52,74 @@ class SharePointConstants(object):
     }
     FALLBACK_TYPE = "Text"
     TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_CONNECT_TIMEOUT = 30
+    DEFAULT_READ_TIMEOUT = 300
+    FILE_CHUNK_SIZE = 1024 * 1024
+    DEFAULT_UPLOAD_CHUNK_SIZE = 10
+    DEFAULT_MAX_RETRIES = 5
+    RETRY_BASE_DELAY = 1
+    MAX_RETRY_DELAY = 60
+    DEFAULT_FORM_DIGEST_TIMEOUT = 1800
+    FORM_DIGEST_REFRESH_MARGIN = 120
+    THROTTLING_STATUS_CODES = [429, 503]
+    TRANSIENT_STATUS_CODES = [429, 502, 503, 504]
+    DEFAULT_BATCH_SIZE = 100
+    READ_MODE_FULL = "full"
+    READ_MODE_INCREMENTAL_MERGED = "incremental_merged"
+    READ_MODE_INCREMENTAL_DELTA = "incremental_delta"
+    # SP.ChangeType values: Add, Restore / Update, Rename, MoveInto, SystemUpdate / DeleteObject, MoveAway
+    ADDING_CHANGE_TYPES = [1, 7]
+    UPDATING_CHANGE_TYPES = [2, 4, 6, 15]
+    DELETING_CHANGE_TYPES = [3, 5]
+    ITEMS_PER_ID_FILTER = 50
+    ITEM_ID_COLUMN = "sharepoint_item_id"
+    CHANGE_TYPE_COLUMN = "sharepoint_change_type"
+    CHANGE_ADDED = "added"
+    CHANGE_UPDATED = "updated"
+    CHANGE_DELETED = "deleted"
+    WRITE_MODE_OVERWRITE = "overwrite"
+    WRITE_MODE_APPEND = "append"
+    WRITE_MODE_UPSERT = "upsert"
+    RECORDS_COUNT_ITEM_COUNT = "item_count"
+    RECORDS_COUNT_SCAN = "scan"
+    PARTITIONING_NONE = "none"
+    PARTITIONING_DISCRETE = "discrete"
+    PARTITIONING_TIME = "time"
+    DEFAULT_PARTITIONING_PERIOD = "DAY"
+    PARTITION_ID_FORMATS = {
+        "YEAR": "%Y",
+        "MONTH": "%Y-%m",
+        "DAY": "%Y-%m-%d"
+    }
+    NUMERIC_TYPES = ["Number", "Integer", "Counter", "Currency"]
+    LOOKUP_TYPES = ["Lookup", "LookupMulti", "User", "UserMulti"]
+    FILES_SELECT = ["Name", "Length", "TimeLastModified"]
+    FOLDERS_SELECT = ["Name", "TimeLastModified"]
+    FIELDS_SELECT = ["Title", "EntityPropertyName", "StaticName", "Hidden", "ReadOnlyField", "TypeAsString", "LookupField"]
+    FILE_PROPERTIES = ["Exists", "Name", "Length", "TimeLastModified"]
+    FOLDER_PROPERTIES = ["Exists", "Name", "TimeLastModified"]
+    DEFAULT_METADATA_CACHE_TTL = 30
+    DEFAULT_METADATA_CACHE_SIZE = 1000
+    ENUMERATION_MODE_FOLDERS = "folders"
+    ENUMERATION_MODE_RECURSIVE_QUERY = "recursive_query"
+    RECURSIVE_QUERY_PAGE_SIZE = 5000
+    MAX_PAGE_SIZE = 5000
+    MIN_PAGE_SIZE = 100
+    PAGE_TARGET_DURATION = 2
+    MAX_PAGE_BYTES = 16 * 1024 * 1024
+    PAGINATION_NEXT_LINK = "next_link"
+    PAGINATION_KEYSET = "keyset"
+    STREAMING_BUFFER_SIZE = 1000
+    READ_STRATEGY_SEQUENTIAL = "sequential"
+    READ_STRATEGY_SHARDED = "sharded"
+    SHARD_ORDERING_DETERMINISTIC = "deterministic"
+    SHARD_ORDERING_UNORDERED = "unordered"
+    DEFAULT_SHARD_COUNT = 4
+    SHARD_BUFFER_SIZE = 10000
+    SHARD_RANGE_WIDTH = 1000
+    RECURSIVE_FILES_FIELDS = ["ID", "FileRef", "File_x0020_Size", "Modified", "FSObjType"]
+    RECURSIVE_FILES_VIEW_XML = "<View Scope='RecursiveAll'><Query><OrderBy><FieldRef Name='ID' Ascending='TRUE'/></OrderBy></Query>" \
+        "<ViewFields><FieldRef Name='ID'/><FieldRef Name='FileRef'/><FieldRef Name='File_x0020_Size'/><FieldRef Name='Modified'/>" \
+        "<FieldRef Name='FSObjType'/></ViewFields><RowLimit Paged='TRUE'>{}</RowLimit></View>"
     GET_FOLDER_URL_STRUCTURE = "{0}/{1}/_api/Web/GetFolderByServerRelativeUrl('/{1}/{2}{3}')"
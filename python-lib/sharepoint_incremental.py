@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+import logging
+
+from sharepoint_constants import SharePointConstants
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO,
+                    format='sharepoint plugin %(levelname)s - %(message)s')
+
+
+class IncrementalReadState(object):
+    # Change token of the last read of a list, and in merged mode the rows read so far,
+    # stored as a JSON file in a local folder. The state is reset when the list's columns change.
+
+    def __init__(self, state_folder, state_key, columns):
+        if not state_folder:
+            raise Exception("A local state folder is required for incremental reads")
+        file_name = "{}.json".format(hashlib.sha1(state_key.encode("utf-8")).hexdigest())
+        self.path = os.path.join(state_folder, file_name)
+        self.columns = columns
+        self.change_token = None
+        self.rows = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as state_file:
+            state = json.load(state_file)
+        if state.get("columns") != self.columns:
+            logger.info("The list columns changed since the last incremental read, starting over")
+            return
+        self.change_token = state.get("change_token")
+        self.rows = state.get("rows", {})
+
+    def save(self):
+        state = {
+            "columns": self.columns,
+            "change_token": self.change_token,
+            "rows": self.rows
+        }
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary_path, self.path)
+
+
+def get_changed_item_ids(changes):
+    # Returns the items added or updated, with their change type, and the items deleted since the change token
+    changed_items = {}
+    deleted_items = set()
+    for change in changes:
+        item_id = change.get(SharePointConstants.ITEM_ID)
+        change_type = int(change.get(SharePointConstants.CHANGE_TYPE, 0))
+        if item_id is None:
+            continue
+        if change_type in SharePointConstants.ADDING_CHANGE_TYPES:
+            changed_items[item_id] = SharePointConstants.CHANGE_ADDED
+            deleted_items.discard(item_id)
+        elif change_type in SharePointConstants.UPDATING_CHANGE_TYPES:
+            if changed_items.get(item_id) != SharePointConstants.CHANGE_ADDED:
+                changed_items[item_id] = SharePointConstants.CHANGE_UPDATED
+            deleted_items.discard(item_id)
+        elif change_type in SharePointConstants.DELETING_CHANGE_TYPES:
+            changed_items.pop(item_id, None)
+            deleted_items.add(item_id)
+    return changed_items, deleted_items
@@ -2,13 +2,11 @@ import os.path
 
 from sharepoint_constants import SharePointConstants
 from datetime import datetime
-from common import get_lnt_path, get_rel_path
+from common import get_lnt_path, get_rel_path, get_results
 
 
 def loop_sharepoint_items(items):
-    if SharePointConstants.RESULTS_CONTAINER_V2 not in items or SharePointConstants.RESULTS not in items[SharePointConstants.RESULTS_CONTAINER_V2]:
-        yield
-    for item in items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]:
+    for item in get_results(items) or []:
         yield item
 
 
@@ -19,15 +17,6 @@ def extract_item_from(item_name, items):
     return None
 
 
-def has_sharepoint_items(items):
-    if SharePointConstants.RESULTS_CONTAINER_V2 not in items or SharePointConstants.RESULTS not in items[SharePointConstants.RESULTS_CONTAINER_V2]:
-        return False
-    if len(items[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]) > 0:
-        return True
-    else:
-        return False
-
-
 def get_last_modified(item):
     if SharePointConstants.TIME_LAST_MODIFIED in item:
         return int(format_date(item[SharePointConstants.TIME_LAST_MODIFIED]))
@@ -64,10 +53,33 @@ def assert_path_is_not_root(path):
         raise Exception("Cannot delete root path")
 
 
-def create_path(client, file_full_path):
+def create_path(client, file_full_path, known_folders=None):
+    known_folders = set() if known_folders is None else known_folders
     full_path, filename = os.path.split(file_full_path)
     tokens = full_path.split("/")
     path = ""
+    folders = []
     for token in tokens:
         path = get_lnt_path(path + "/" + token)
-        client.create_folder(path)
+        if path != "/" and path not in folders:
+            folders.append(path)
+    missing_folders = [folder for folder in folders if folder not in known_folders]
+    if len(missing_folders) == 0:
+        return
+    # Most of the time only the deepest folder is missing, so start there and walk up on failure
+    created_index = len(missing_folders) - 1
+    while created_index >= 0 and client.create_folder(missing_folders[created_index]).status_code >= 400:
+        created_index -= 1
+    if created_index < 0:
+        return
+    for folder in missing_folders[created_index + 1:]:
+        client.create_folder(folder)
+    known_folders.update(folders)
+
+
+def forget_folder_tree(known_folders, full_path):
+    full_path = get_lnt_path(full_path)
+    sub_path_prefix = full_path.rstrip("/") + "/"
+    for folder in list(known_folders):
+        if folder == full_path or folder.startswith(sub_path_prefix):
+            known_folders.discard(folder)
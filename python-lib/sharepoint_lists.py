@@ -1,7 +1,15 @@
+import re
+import json
+import hashlib
 import logging
 
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
 from sharepoint_constants import SharePointConstants
 from dss_constants import DSSConstants
+from sharepoint_batch import get_batch_error
+from common import get_int_parameter, get_results, get_entity
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -9,11 +17,11 @@ logging.basicConfig(level=logging.INFO,
 
 
 def is_response_empty(response):
-    return SharePointConstants.RESULTS_CONTAINER_V2 not in response or SharePointConstants.RESULTS not in response[SharePointConstants.RESULTS_CONTAINER_V2]
+    return get_results(response) is None
 
 
 def extract_results(response):
-    return response[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.RESULTS]
+    return get_results(response)
 
 
 def get_dss_type(sharepoint_type):
@@ -27,42 +35,178 @@ def get_sharepoint_type(dss_type):
     return DSSConstants.TYPES.get(dss_type, SharePointConstants.FALLBACK_TYPE)
 
 
-def matched_item(column_ids, column_names, item):
+def get_fields_by_name(fields):
+    # Returns the fields by internal name, and the internal name each title designates. Hidden and computed fields
+    # often share their title with a column (LinkTitle is titled Title, Last_x0020_Modified Modified), so a title
+    # designates its first visible and writable field, else its first visible one.
+    fields_by_name = {}
+    names_by_title = {}
+    for field in fields:
+        internal_name = field[SharePointConstants.ENTITY_PROPERTY_NAME]
+        fields_by_name[internal_name] = field
+        title = field[SharePointConstants.TITLE_COLUMN]
+        if title not in names_by_title or get_field_rank(field) < get_field_rank(fields_by_name[names_by_title[title]]):
+            names_by_title[title] = internal_name
+    return fields_by_name, names_by_title
+
+
+def get_field_rank(field):
+    if field[SharePointConstants.HIDDEN_COLUMN]:
+        return 2
+    if field[SharePointConstants.READ_ONLY_FIELD]:
+        return 1
+    return 0
+
+
+def is_writable_field(field):
+    return get_field_rank(field) == 0
+
+
+def get_projection(fields, expand_lookup=False):
+    # Ordered (internal name, output name, lookup sub key) of the columns read from a list
+    projection = []
+    for field in fields:
+        if field[SharePointConstants.HIDDEN_COLUMN] or field[SharePointConstants.READ_ONLY_FIELD]:
+            continue
+        if get_dss_type(field[SharePointConstants.TYPE_AS_STRING]) is None:
+            continue
+        sub_key = None
+        if field[SharePointConstants.TYPE_AS_STRING] in SharePointConstants.LOOKUP_TYPES:
+            if not (expand_lookup and field[SharePointConstants.TYPE_AS_STRING] == "Lookup"):
+                continue
+            sub_key = get_lookup_field(field)
+        projection.append((field[SharePointConstants.ENTITY_PROPERTY_NAME], field[SharePointConstants.TITLE_COLUMN], sub_key))
+    return tuple(projection)
+
+
+def get_projection_columns(projection):
+    # Maps each internal name to its lookup sub key, as used to build $select and $expand
+    return dict((internal_name, sub_key) for internal_name, output_name, sub_key in projection)
+
+
+def project_item(projection, item):
     ret = {}
-    for key, value in item.items():
-        if key in column_ids:
-            name = column_names[key]
-            ret[name] = value
+    for internal_name, output_name, sub_key in projection:
+        if internal_name not in item:
+            continue
+        value = item[internal_name]
+        if sub_key is not None and value is not None:
+            value = value.get(sub_key)
+        ret[output_name] = value
     return ret
 
 
-def expand_matched_item(column_ids, column_names, item, column_to_expand=None):
-    ret = {}
-    for key, value in item.items():
-        if key in column_ids:
-            name = column_names[key]
-            key_to_return = column_to_expand.get(key)
-            if key_to_return:
-                ret[name] = value.get(key_to_return)
-            else:
-                ret[name] = value
-    return ret
+def get_partition_filter(field, partitioning_type, period, partition_id):
+    # Returns the $filter restricting a list to a partition, and the lookup to expand for it if any
+    internal_name = field[SharePointConstants.ENTITY_PROPERTY_NAME]
+    if partitioning_type == SharePointConstants.PARTITIONING_TIME:
+        period_start, period_end = get_period_bounds(partition_id, period)
+        return "{0} ge datetime'{1}' and {0} lt datetime'{2}'".format(
+            internal_name,
+            period_start.strftime(SharePointConstants.TIME_FORMAT),
+            period_end.strftime(SharePointConstants.TIME_FORMAT)
+        ), None
+    field_type = field[SharePointConstants.TYPE_AS_STRING]
+    if field_type in SharePointConstants.LOOKUP_TYPES:
+        return "{}/{} eq '{}'".format(internal_name, get_lookup_field(field), escape_filter_value(partition_id)), internal_name
+    if field_type in SharePointConstants.NUMERIC_TYPES:
+        float(partition_id)
+        return "{} eq {}".format(internal_name, partition_id), None
+    return "{} eq '{}'".format(internal_name, escape_filter_value(partition_id)), None
+
+
+def get_period_bounds(partition_id, period):
+    period_format = SharePointConstants.PARTITION_ID_FORMATS.get(period)
+    if period_format is None:
+        raise Exception("Unsupported partitioning period {}".format(period))
+    period_start = datetime.strptime(partition_id, period_format)
+    if period == "YEAR":
+        period_end = period_start.replace(year=period_start.year + 1)
+    elif period == "MONTH":
+        period_end = (period_start + timedelta(days=32)).replace(day=1)
+    else:
+        period_end = period_start + timedelta(days=1)
+    return period_start, period_end
+
+
+def get_partition_id(field, partitioning_type, period, value):
+    if isinstance(value, dict):
+        value = value.get(get_lookup_field(field))
+    if value is None or value == "":
+        return None
+    if partitioning_type == SharePointConstants.PARTITIONING_TIME:
+        return datetime.strptime(value, SharePointConstants.TIME_FORMAT).strftime(SharePointConstants.PARTITION_ID_FORMATS[period])
+    return "{}".format(value)
+
+
+def get_id_shards(min_id, max_id, shard_count):
+    # Splits [min_id, max_id] into up to shard_count half open ranges of about the same width
+    return get_id_ranges(min_id, max_id, max(1, -(-(max_id - min_id + 1) // shard_count)))
+
+
+def get_id_ranges(min_id, max_id, range_width):
+    # Splits [min_id, max_id] into half open ranges of range_width IDs, the last one possibly narrower
+    id_ranges = []
+    for range_start in range(min_id, max_id + 1, range_width):
+        id_ranges.append((range_start, min(range_start + range_width, max_id + 1)))
+    return id_ranges
+
 
+def get_id_shard_filter(shard, filter_query=None):
+    shard_filter = "{0} ge {1} and {0} lt {2}".format(SharePointConstants.ID, shard[0], shard[1])
+    if filter_query is None:
+        return shard_filter
+    return "({}) and {}".format(filter_query, shard_filter)
 
-def is_error(response):
-    return _has_error(response) and _has_message(response) and _has_value(response)
 
+def get_lookup_field(field):
+    return field.get(SharePointConstants.LOOKUP_FIELD) or SharePointConstants.TITLE_COLUMN
 
-def _has_error(response):
-    return SharePointConstants.ERROR_CONTAINER in response
 
+def escape_filter_value(value):
+    return "{}".format(value).replace("'", "''")
 
-def _has_message(response):
-    return SharePointConstants.MESSAGE in response[SharePointConstants.ERROR_CONTAINER]
 
+def get_comparable_value(value, field_type=None):
+    # DSS and SharePoint do not type values the same way: 3 and 3.0, None and "", "true" and True,
+    # or "2023-05-02T00:00:00.000Z" and "2023-05-02T00:00:00Z" are taken as equal
+    if value is None or value == "":
+        return ""
+    if field_type == "DateTime":
+        return get_comparable_date(value)
+    if field_type == "Boolean":
+        return get_comparable_boolean(value)
+    if field_type in SharePointConstants.NUMERIC_TYPES and not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "{}".format(value)
 
-def _has_value(response):
-    return SharePointConstants.VALUE in response[SharePointConstants.ERROR_CONTAINER][SharePointConstants.MESSAGE]
+
+def get_comparable_date(value):
+    if isinstance(value, datetime):
+        return value.strftime(SharePointConstants.TIME_FORMAT)
+    match = re.match(r"^(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?)?(?:Z|[+-]00:?00)?$", "{}".format(value))
+    if match is None:
+        return "{}".format(value)
+    return "{}T{}Z".format(match.group(1), match.group(2) or "00:00:00")
+
+
+def get_comparable_boolean(value):
+    comparable_value = "{}".format(value).lower()
+    if comparable_value in ["true", "1", "yes"]:
+        return "true"
+    if comparable_value in ["false", "0", "no"]:
+        return "false"
+    return comparable_value
+
+
+def get_row_hash(values, field_types):
+    comparable_values = json.dumps([get_comparable_value(value, field_type) for value, field_type in zip(values, field_types)])
+    return hashlib.sha1(comparable_values.encode("utf-8")).hexdigest()
 
 
 def assert_list_title(list_title):
@@ -82,31 +226,152 @@ class SharePointListWriter(object):
         logger.info('init SharepointListWriter')
         self.columns = dataset_schema[SharePointConstants.COLUMNS]
         self.column_internal_name = {}
+        # SharePoint type of the field each column is written to, to compare the values of both sides
+        self.column_field_type = {}
+        self.field_types = []
+        self.entity_type = None
+        self.batch_size = get_int_parameter(config, "batch_size", SharePointConstants.DEFAULT_BATCH_SIZE)
+        self.chunk_size = max(self.batch_size, SharePointConstants.DEFAULT_BATCH_SIZE)
+        self.is_list_provisioned = False
+        self.rows_sent = 0
+        self.failed_rows = 0
+        # Chunks are uploaded on a single worker while DSS keeps producing rows,
+        # so at most one chunk is being sent while the next one is buffered
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_upload = None
+        self.write_mode = config.get("write_mode", SharePointConstants.WRITE_MODE_OVERWRITE)
+        self.key_column = config.get("upsert_key_column")
+        self.delete_missing_rows = config.get("delete_missing_rows", False) is True
+        # Key of each item already in the list, mapped to its ID and the hash of its written columns
+        self.existing_items = {}
+        self.matched_item_ids = set()
+        if self.write_mode == SharePointConstants.WRITE_MODE_UPSERT:
+            column_names = [column[SharePointConstants.NAME_COLUMN] for column in self.columns]
+            if self.key_column not in column_names:
+                raise Exception("The upsert key column '{}' is not part of the dataset schema".format(self.key_column))
+            self.key_index = column_names.index(self.key_column)
 
     def write_row(self, row):
-        logger.info('write_row:row={}'.format(row))
+        logger.debug('write_row:row={}'.format(row))
+        if not self.is_list_provisioned:
+            self.provision_list()
         self.buffer.append(row)
-
-    def flush(self):
-        self.parent.client.delete_list(self.parent.sharepoint_list_title.lower())
-        self.parent.client.create_list(self.parent.sharepoint_list_title.lower())
-
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def provision_list(self):
+        list_title = self.parent.sharepoint_list_title
+        if self.write_mode == SharePointConstants.WRITE_MODE_OVERWRITE:
+            self.parent.client.delete_list(list_title.lower())
+            self.parent.client.create_list(list_title.lower())
+        elif not self.parent.client.list_exists(list_title):
+            self.parent.client.create_list(list_title.lower())
+
+        self.entity_type = self.parent.client.get_list_item_entity_type(list_title)
         self.parent.get_read_schema()
+        missing_columns = []
         for column in self.columns:
+            # A column named like a hidden or computed field only, such as LinkTitle, gets a field of its own
+            field = self.parent.get_field(column[SharePointConstants.NAME_COLUMN])
+            if field is None or not is_writable_field(field):
+                missing_columns.append(column)
+            else:
+                self.column_internal_name[column[SharePointConstants.NAME_COLUMN]] = field[SharePointConstants.ENTITY_PROPERTY_NAME]
+                self.column_field_type[column[SharePointConstants.NAME_COLUMN]] = field[SharePointConstants.TYPE_AS_STRING]
+        if missing_columns:
+            self.create_fields(missing_columns)
+        self.field_types = [self.column_field_type[column[SharePointConstants.NAME_COLUMN]] for column in self.columns]
+        if self.write_mode == SharePointConstants.WRITE_MODE_UPSERT:
+            self.load_existing_items()
+        self.is_list_provisioned = True
+
+    def create_fields(self, columns):
+        fields = []
+        for column in columns:
             dss_type = column.get(SharePointConstants.TYPE_COLUMN, DSSConstants.FALLBACK_TYPE)
-            sharepoint_type = get_sharepoint_type(dss_type)
-            if column[SharePointConstants.NAME_COLUMN] not in self.parent.column_ids:
-                response = self.parent.client.create_custom_field(
-                    self.parent.sharepoint_list_title,
-                    column[SharePointConstants.NAME_COLUMN],
-                    field_type=sharepoint_type
-                )
-                json = response.json()
-                self.column_internal_name[column[SharePointConstants.NAME_COLUMN]] = json[SharePointConstants.RESULTS_CONTAINER_V2][SharePointConstants.ENTITY_PROPERTY_NAME]
-
-        for row in self.buffer:
-            item = self.build_row_dictionary(row)
-            self.parent.client.add_list_item(self.parent.sharepoint_list_title, item)
+            fields.append((column[SharePointConstants.NAME_COLUMN], get_sharepoint_type(dss_type)))
+        results = self.parent.client.create_custom_fields(self.parent.sharepoint_list_title, fields)
+        for column, (field_title, field_type), (status_code, body) in zip(columns, fields, results):
+            if status_code >= 400:
+                raise Exception("Column '{}' could not be created: {}".format(column[SharePointConstants.NAME_COLUMN], get_batch_error(body)))
+            field = get_entity(json.loads(body))
+            self.column_internal_name[column[SharePointConstants.NAME_COLUMN]] = field[SharePointConstants.ENTITY_PROPERTY_NAME]
+            self.column_field_type[column[SharePointConstants.NAME_COLUMN]] = field.get(SharePointConstants.TYPE_AS_STRING, field_type)
+
+    def load_existing_items(self):
+        internal_names = [self.column_internal_name[column[SharePointConstants.NAME_COLUMN]] for column in self.columns]
+        columns_to_read = dict((internal_name, None) for internal_name in internal_names)
+        columns_to_read[SharePointConstants.ID] = None
+        self.existing_items = {}
+        for page in self.parent.client.get_list_pages(self.parent.sharepoint_list_title, column_to_expand=columns_to_read):
+            for item in page:
+                values = [item.get(internal_name) for internal_name in internal_names]
+                key = get_comparable_value(values[self.key_index], self.field_types[self.key_index])
+                self.existing_items[key] = (item.get(SharePointConstants.ID), get_row_hash(values, self.field_types))
+        logger.info("load_existing_items:{} items in list".format(len(self.existing_items)))
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        self.wait_for_pending_upload()
+        rows = self.buffer
+        self.buffer = []
+        self.pending_upload = self.executor.submit(self.add_rows, rows, self.rows_sent)
+        self.rows_sent += len(rows)
+
+    def wait_for_pending_upload(self):
+        if self.pending_upload is not None:
+            self.failed_rows += self.pending_upload.result()
+            self.pending_upload = None
+
+    def add_rows(self, rows, first_row_index):
+        operations = []
+        for row_index, row in enumerate(rows, first_row_index):
+            operation = self.get_row_operation(row)
+            if operation is not None:
+                operations.append(("Row {}".format(row_index), operation))
+        return self.send_operations(operations)
+
+    def get_row_operation(self, row):
+        client = self.parent.client
+        list_title = self.parent.sharepoint_list_title
+        if self.write_mode != SharePointConstants.WRITE_MODE_UPSERT:
+            return client.get_add_item_operation(list_title, self.entity_type, self.build_row_dictionary(row))
+        existing_item = self.existing_items.get(get_comparable_value(row[self.key_index], self.field_types[self.key_index]))
+        if existing_item is None:
+            return client.get_add_item_operation(list_title, self.entity_type, self.build_row_dictionary(row))
+        item_id, row_hash = existing_item
+        self.matched_item_ids.add(item_id)
+        if get_row_hash(row, self.field_types) == row_hash:
+            return None
+        return client.get_update_item_operation(list_title, self.entity_type, item_id, self.build_row_dictionary(row))
+
+    def send_operations(self, operations):
+        # operations are (description, batch operation) tuples, returns the number of failed operations
+        if self.batch_size <= 1:
+            for description, operation in operations:
+                self.parent.client.send_operation(operation)
+            return 0
+        failed_operations = 0
+        for batch_start in range(0, len(operations), self.batch_size):
+            batch = operations[batch_start:batch_start + self.batch_size]
+            results = self.parent.client.post_batch([operation for description, operation in batch])
+            for (description, operation), (status_code, body) in zip(batch, results):
+                if status_code >= 400:
+                    failed_operations += 1
+                    logger.error("{} could not be written: {}".format(description, get_batch_error(body)))
+        return failed_operations
+
+    def delete_missing_items(self):
+        operations = []
+        for item_id, row_hash in self.existing_items.values():
+            if item_id not in self.matched_item_ids:
+                operations.append((
+                    "Deletion of item {}".format(item_id),
+                    self.parent.client.get_delete_item_operation(self.parent.sharepoint_list_title, item_id)
+                ))
+        logger.info("delete_missing_items:deleting {} items".format(len(operations)))
+        self.failed_rows += self.send_operations(operations)
 
     def build_row_dictionary(self, row):
         ret = {}
@@ -115,4 +380,14 @@ class SharePointListWriter(object):
         return ret
 
     def close(self):
-        self.flush()
+        try:
+            if not self.is_list_provisioned:
+                self.provision_list()
+            self.flush()
+            self.wait_for_pending_upload()
+            if self.write_mode == SharePointConstants.WRITE_MODE_UPSERT and self.delete_missing_rows:
+                self.delete_missing_items()
+        finally:
+            self.executor.shutdown(wait=False)
+        if self.failed_rows > 0:
+            raise Exception("{} row(s) could not be written to the list, check the logs for details".format(self.failed_rows))
@@ -0,0 +1,82 @@
+from sharepoint_constants import SharePointConstants
+
+
+class ListPager(object):
+    # Tracks the requests paging through list items, either following the next page links returned by
+    # SharePoint or, with keyset paging, asking for the items whose ID is above the last one received.
+    # get_params(filter_query, top) builds the query parameters of a page.
+
+    def __init__(self, url, get_params, filter_query=None, records_limit=None, page_size=None, keyset=False, tuner=None):
+        self.get_params = get_params
+        self.filter_query = filter_query
+        self.records_left = records_limit if records_limit is not None and records_limit > 0 else None
+        self.keyset = keyset
+        self.tuner = tuner
+        self.page_size = page_size if page_size else None
+        if self.keyset and self.page_size is None:
+            self.page_size = SharePointConstants.MAX_PAGE_SIZE
+        if self.tuner is not None:
+            self.page_size = self.tuner.page_size
+        self.top = None
+        self.url = url
+        self.params = self.get_page_params(filter_query)
+
+    def has_next_page(self):
+        return self.url is not None
+
+    def get_page_params(self, filter_query):
+        self.top = self.get_top()
+        params = self.get_params(filter_query, self.top)
+        if self.keyset:
+            params["$orderby"] = SharePointConstants.ID
+        return params
+
+    def get_top(self):
+        if self.records_left is None:
+            return self.page_size
+        return min(self.records_left, self.page_size or SharePointConstants.MAX_PAGE_SIZE)
+
+    def truncate(self, results):
+        if self.records_left is None:
+            return results
+        return results[:self.records_left]
+
+    def update(self, item_count, last_item, next_page_url, duration=None, size=None):
+        if self.records_left is not None:
+            self.records_left -= item_count
+            if self.records_left <= 0:
+                self.url = None
+                return
+        if not self.keyset:
+            self.url = next_page_url
+            self.params = None
+            return
+        if item_count < self.top or last_item is None:
+            self.url = None
+            return
+        if self.tuner is not None and duration is not None:
+            self.page_size = self.tuner.update(item_count, duration, size)
+        keyset_filter = "{} gt {}".format(SharePointConstants.ID, last_item.get(SharePointConstants.ID))
+        if self.filter_query is not None:
+            keyset_filter = "({}) and {}".format(self.filter_query, keyset_filter)
+        self.params = self.get_page_params(keyset_filter)
+
+
+class PageSizeTuner(object):
+    # Scales the page size so that a page takes about target_duration seconds to be received,
+    # without going above max_page_bytes. Each update changes the size by a factor of 2 at most.
+
+    def __init__(self, page_size=None, target_duration=SharePointConstants.PAGE_TARGET_DURATION, max_page_bytes=SharePointConstants.MAX_PAGE_BYTES):
+        self.page_size = page_size or SharePointConstants.MIN_PAGE_SIZE
+        self.target_duration = target_duration
+        self.max_page_bytes = max_page_bytes
+
+    def update(self, item_count, duration, size=None):
+        if item_count < 1:
+            return self.page_size
+        page_size = item_count * self.target_duration / max(duration, 0.001)
+        if size:
+            page_size = min(page_size, item_count * self.max_page_bytes / float(size))
+        page_size = min(max(page_size, self.page_size / 2.0), self.page_size * 2.0)
+        self.page_size = int(min(max(page_size, SharePointConstants.MIN_PAGE_SIZE), SharePointConstants.MAX_PAGE_SIZE))
+        return self.page_size
@@ -0,0 +1,49 @@
+import logging
+
+from sharepoint_constants import SharePointConstants
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_streaming_available():
+    return ijson is not None
+
+
+class StreamedPage(object):
+    # Decodes the items of a verbose or nometadata collection page while its body is received.
+    # The link to the next page is only known once all the items have been read.
+
+    ITEM_PREFIXES = [
+        "{}.{}.item".format(SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.RESULTS),
+        "{}.item".format(SharePointConstants.VALUE)
+    ]
+    NEXT_PAGE_PREFIXES = [
+        "{}.{}".format(SharePointConstants.RESULTS_CONTAINER_V2, SharePointConstants.NEXT_PAGE),
+        SharePointConstants.NEXT_LINK
+    ]
+
+    def __init__(self, response):
+        self.response = response
+        self.next_page_url = None
+
+    def items(self):
+        self.response.raw.decode_content = True
+        builder = None
+        item_prefix = None
+        for prefix, event, value in ijson.parse(self.response.raw, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == item_prefix and event == "end_map":
+                    yield builder.value
+                    builder = None
+            elif event == "start_map" and prefix in self.ITEM_PREFIXES:
+                item_prefix = prefix
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif event == "string" and prefix in self.NEXT_PAGE_PREFIXES:
+                self.next_page_url = value
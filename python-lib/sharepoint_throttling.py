@@ -0,0 +1,59 @@
+import time
+import random
+import threading
+
+from email.utils import parsedate_tz, mktime_tz
+
+from sharepoint_constants import SharePointConstants
+
+
+class AdaptiveConcurrencyLimiter(object):
+    # AIMD limiter on the number of requests in flight: the limit is halved each time the
+    # server throttles, and raised by one after a full window of successful requests.
+    # Failed requests (connection errors, server errors) neither raise nor lower it.
+
+    def __init__(self, max_limit):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, is_throttled=False, is_failed=False):
+        with self.condition:
+            self.in_flight -= 1
+            if is_throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            elif not is_failed:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+def get_retry_after(response):
+    # Delay asked for by the server, capped so that a single response cannot hold a job up indefinitely
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        delay = float(retry_after)
+    except ValueError:
+        retry_date = parsedate_tz(retry_after)
+        if retry_date is None:
+            return None
+        delay = mktime_tz(retry_date) - time.time()
+    return min(max(0.0, delay), SharePointConstants.MAX_RETRY_DELAY)
+
+
+def get_backoff_delay(attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(SharePointConstants.MAX_RETRY_DELAY, SharePointConstants.RETRY_BASE_DELAY * 2 ** attempt))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The plugin's library is on the path in DSS, the tests need to add it themselves
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "python-lib"))
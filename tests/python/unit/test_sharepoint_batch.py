@@ -0,0 +1,105 @@
+import json
+import pytest
+
+from sharepoint_batch import build_batch_body, parse_batch_response, get_operation_results, get_batch_error
+
+ITEMS_URL = "http://sp2016/sites/dss/_api/Web/lists/GetByTitle('benchlist')/Items"
+ADDED_ITEM = (
+    "{\"d\":{\"__metadata\":{\"id\":\"Web/Lists(guid'0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0')/Items(12)\","
+    "\"uri\":\"http://sp2016/sites/dss/_api/Web/Lists(guid'0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0')/Items(12)\","
+    "\"etag\":\"\\\"1\\\"\",\"type\":\"SP.Data.BenchlistListItem\"},\"Id\":12,\"Title\":\"a\",\"ID\":12}}"
+)
+PROPERTY_ERROR = (
+    "{\"error\":{\"code\":\"-1, Microsoft.SharePoint.Client.InvalidClientQueryException\","
+    "\"message\":{\"lang\":\"en-US\",\"value\":\"The property 'Amount' does not exist on type 'SP.Data.BenchlistListItem'. "
+    "Make sure to only use property names that are defined by the type.\"}}}"
+)
+
+
+def get_response_part(status_line, body=None):
+    # SharePoint answers the operations of a changeset as parts of the batch itself
+    lines = [
+        "--batchresponse_6e1f5b46-8c1a-4a27-9f6b-2f0bf0c2a1d4",
+        "Content-Type: application/http",
+        "Content-Transfer-Encoding: binary",
+        "",
+        status_line,
+        "CONTENT-TYPE: application/json;odata=verbose;charset=utf-8",
+        ""
+    ]
+    if body is not None:
+        lines.append(body)
+    return lines
+
+
+def get_batch_response(*parts):
+    lines = []
+    for part in parts:
+        lines.extend(part)
+    lines.extend(["--batchresponse_6e1f5b46-8c1a-4a27-9f6b-2f0bf0c2a1d4--", ""])
+    return "\r\n".join(lines)
+
+
+def test_mixed_statuses_are_returned_in_order():
+    response = get_batch_response(
+        get_response_part("HTTP/1.1 201 Created", ADDED_ITEM),
+        get_response_part("HTTP/1.1 400 Bad Request", PROPERTY_ERROR),
+        get_response_part("HTTP/1.1 204 No Content")
+    )
+    results = parse_batch_response(response)
+    assert [status_code for status_code, body in results] == [201, 400, 204]
+    assert json.loads(results[0][1])["d"]["ID"] == 12
+    assert get_batch_error(results[1][1]).startswith("The property 'Amount' does not exist")
+    assert results[2][1] == ""
+
+
+def test_empty_body_without_blank_line_before_boundary():
+    response = get_batch_response(
+        ["--batchresponse_6e1f5b46-8c1a-4a27-9f6b-2f0bf0c2a1d4", "Content-Type: application/http", "", "HTTP/1.1 204 No Content"],
+        get_response_part("HTTP/1.1 201 Created", ADDED_ITEM)
+    )
+    assert [status_code for status_code, body in parse_batch_response(response)] == [204, 201]
+    assert parse_batch_response(response)[0][1] == ""
+
+
+def test_merge_without_body():
+    operation = ("POST", ITEMS_URL + "(12)", {"X-HTTP-Method": "MERGE", "IF-MATCH": "*"}, None)
+    body = build_batch_body("batch_1", "changeset_1", [operation])
+    lines = body.split("\r\n")
+    request_line = lines.index("POST {}(12) HTTP/1.1".format(ITEMS_URL))
+    headers = lines[request_line + 1:lines.index("", request_line)]
+    assert "X-HTTP-Method: MERGE" in headers
+    assert "IF-MATCH: *" in headers
+    assert lines[lines.index("", request_line) + 1] == ""
+    assert lines[-3:] == ["--changeset_1--", "--batch_1--", ""]
+
+
+def test_operations_share_one_changeset():
+    operations = [
+        ("POST", ITEMS_URL, None, {"Title": "a"}),
+        ("POST", ITEMS_URL + "(3)", {"X-HTTP-Method": "DELETE", "IF-MATCH": "*"}, None)
+    ]
+    body = build_batch_body("batch_1", "changeset_1", operations)
+    assert body.startswith("--batch_1\r\nContent-Type: multipart/mixed; boundary=\"changeset_1\"\r\n")
+    assert body.count("--changeset_1\r\n") == 2
+    assert "\r\n{\"Title\": \"a\"}\r\n" in body
+
+
+def test_single_changeset_error_stands_for_each_operation():
+    response = get_batch_response(get_response_part("HTTP/1.1 400 Bad Request", PROPERTY_ERROR))
+    results = get_operation_results(parse_batch_response(response), 3)
+    assert len(results) == 3
+    assert all(status_code == 400 for status_code, body in results)
+
+
+def test_missing_results_are_an_error():
+    response = get_batch_response(
+        get_response_part("HTTP/1.1 201 Created", ADDED_ITEM),
+        get_response_part("HTTP/1.1 201 Created", ADDED_ITEM)
+    )
+    with pytest.raises(Exception):
+        get_operation_results(parse_batch_response(response), 3)
+
+
+def test_batch_error_of_a_non_json_body():
+    assert get_batch_error("Internal server error") == "Internal server error"
@@ -0,0 +1,67 @@
+from sharepoint_constants import SharePointConstants
+from sharepoint_incremental import get_changed_item_ids
+
+# SP.ChangeType values
+ADD = 1
+UPDATE = 2
+DELETE_OBJECT = 3
+RENAME = 4
+MOVE_AWAY = 5
+MOVE_INTO = 6
+RESTORE = 7
+SYSTEM_UPDATE = 15
+
+
+def get_changes(*changes):
+    # Changes as GetChanges returns them, oldest first
+    return [{"ItemId": item_id, "ChangeType": change_type} for item_id, change_type in changes]
+
+
+def test_add_then_update_stays_added():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, ADD), (1, UPDATE), (1, SYSTEM_UPDATE)))
+    assert changed_items == {1: SharePointConstants.CHANGE_ADDED}
+    assert deleted_items == set()
+
+
+def test_update_then_delete():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, UPDATE), (1, DELETE_OBJECT)))
+    assert changed_items == {}
+    assert deleted_items == {1}
+
+
+def test_add_then_delete():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, ADD), (1, DELETE_OBJECT)))
+    assert changed_items == {}
+    assert deleted_items == {1}
+
+
+def test_delete_then_restore():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, DELETE_OBJECT), (1, RESTORE)))
+    assert changed_items == {1: SharePointConstants.CHANGE_ADDED}
+    assert deleted_items == set()
+
+
+def test_system_update_and_rename_are_updates():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, SYSTEM_UPDATE), (2, RENAME)))
+    assert changed_items == {1: SharePointConstants.CHANGE_UPDATED, 2: SharePointConstants.CHANGE_UPDATED}
+    assert deleted_items == set()
+
+
+def test_moves():
+    # An item moved into a folder of the list is still in it, an item moved to another list is gone
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, MOVE_INTO), (2, UPDATE), (2, MOVE_AWAY)))
+    assert changed_items == {1: SharePointConstants.CHANGE_UPDATED}
+    assert deleted_items == {2}
+
+
+def test_delete_then_move_into():
+    changed_items, deleted_items = get_changed_item_ids(get_changes((1, DELETE_OBJECT), (1, MOVE_INTO)))
+    assert changed_items == {1: SharePointConstants.CHANGE_UPDATED}
+    assert deleted_items == set()
+
+
+def test_changes_without_item_or_type():
+    changes = [{"ChangeType": ADD}, {"ItemId": 1}, {"ItemId": 2, "ChangeType": "2"}]
+    changed_items, deleted_items = get_changed_item_ids(changes)
+    assert changed_items == {2: SharePointConstants.CHANGE_UPDATED}
+    assert deleted_items == set()
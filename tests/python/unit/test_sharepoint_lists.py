@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sharepoint_lists import get_comparable_value, get_row_hash
+
+FIELD_TYPES = ["Text", "Number", "DateTime", "Boolean"]
+
+
+def test_dates_with_and_without_milliseconds():
+    assert get_comparable_value("2023-05-02T10:00:00.000Z", "DateTime") == "2023-05-02T10:00:00Z"
+    assert get_comparable_value("2023-05-02T10:00:00Z", "DateTime") == "2023-05-02T10:00:00Z"
+    assert get_comparable_value("2023-05-02T10:00:00.123456+00:00", "DateTime") == "2023-05-02T10:00:00Z"
+    assert get_comparable_value("2023-05-02", "DateTime") == "2023-05-02T00:00:00Z"
+    assert get_comparable_value(datetime(2023, 5, 2, 10), "DateTime") == "2023-05-02T10:00:00Z"
+
+
+def test_different_dates_stay_different():
+    assert get_comparable_value("2023-05-02T10:00:01.000Z", "DateTime") != get_comparable_value("2023-05-02T10:00:00Z", "DateTime")
+
+
+def test_numbers_of_numeric_fields():
+    for field_type in ["Number", "Integer", "Currency"]:
+        assert get_comparable_value(3, field_type) == "3"
+        assert get_comparable_value("3", field_type) == "3"
+        assert get_comparable_value(3.0, field_type) == "3"
+        assert get_comparable_value("3.0", field_type) == "3"
+    assert get_comparable_value("3.5", "Number") == get_comparable_value(3.5, "Number")
+    assert get_comparable_value("not a number", "Number") == "not a number"
+
+
+def test_numbers_of_text_fields():
+    assert get_comparable_value(3, "Text") == "3"
+    assert get_comparable_value("3", "Text") == "3"
+    assert get_comparable_value(3.0, "Text") == "3"
+    # Only numeric fields parse their strings, a text "3.0" is not the text "3"
+    assert get_comparable_value("3.0", "Text") == "3.0"
+
+
+def test_booleans():
+    for value in [True, "true", "True", "1", 1, "yes"]:
+        assert get_comparable_value(value, "Boolean") == "true"
+    for value in [False, "false", "False", "0", 0, "no"]:
+        assert get_comparable_value(value, "Boolean") == "false"
+
+
+def test_none_and_empty_string():
+    for field_type in FIELD_TYPES + [None]:
+        assert get_comparable_value(None, field_type) == ""
+        assert get_comparable_value("", field_type) == ""
+    assert get_comparable_value(0, "Number") != get_comparable_value(None, "Number")
+    assert get_comparable_value(False, "Boolean") != get_comparable_value(None, "Boolean")
+
+
+def test_row_hash_of_values_as_read_and_as_written():
+    # A row as DSS writes it, and the same row as SharePoint returns it
+    written = ["a", "3", "2023-05-02T10:00:00.000Z", "true"]
+    read = ["a", 3.0, "2023-05-02T10:00:00Z", True]
+    assert get_row_hash(written, FIELD_TYPES) == get_row_hash(read, FIELD_TYPES)
+    assert get_row_hash(["", None, None, None], FIELD_TYPES) == get_row_hash([None, "", "", ""], FIELD_TYPES)
+
+
+def test_row_hash_of_changed_values():
+    row = ["a", "3", "2023-05-02T10:00:00Z", "true"]
+    assert get_row_hash(row, FIELD_TYPES) != get_row_hash(["a", "4", "2023-05-02T10:00:00Z", "true"], FIELD_TYPES)
+    assert get_row_hash(row, FIELD_TYPES) != get_row_hash(["a", "3", "2023-05-02T10:00:00Z", "false"], FIELD_TYPES)
+    assert get_row_hash(row, FIELD_TYPES) != get_row_hash(["a", None, "2023-05-02T10:00:00Z", "true"], FIELD_TYPES)
+    # Values are hashed in their column, moving one to the next column is a change
+    assert get_row_hash(["a", ""], ["Text", "Text"]) != get_row_hash(["", "a"], ["Text", "Text"])